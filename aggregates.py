@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------------------------
+# the per-country summaries behind the bar and risk-quadrant charts, computed once per dataset version
+#
+# build them offline (after `python datastore.py`, and again whenever the data changes) by running:
+#     python aggregates.py
+# which writes small typed column files to ./data/aggregates/ tagged with the version of the data they came from;
+# the app loads those directly when their version matches, and otherwise computes the summaries at startup
+
+import os
+
+import pandas as pd
+
+import datastore
+import humanformat
+import mapdetail
+
+aggregatesDir = os.path.join(datastore.dataDir, 'aggregates')
+
+
+def soil_country_means(dfsoil):
+    # take the mean SOCD by grouping soil dataframe by Country
+    countryMeans = dfsoil['Reporter_Country_SOCD_depth4_5'].groupby(dfsoil['Reporter_Country_name'], observed=True).transform('mean')
+    # keep one row per country with only the columns used in density ranges bar chart
+    dfsoilMeans = pd.DataFrame({
+        'Reporter_Country_name': dfsoil['Reporter_Country_name'],
+        'Reporter_Country_continent': dfsoil['Reporter_Country_continent'],
+        'SOCDcountryMean': countryMeans,
+        'Reporter_Country_pop_est': dfsoil['Reporter_Country_pop_est'],
+    }).drop_duplicates().sort_values(by=['SOCDcountryMean', 'Reporter_Country_continent', 'Reporter_Country_name'], ascending=(False, True, True))
+    # make numbers into a more human readable format, e.g., transform 12345591313 to '12.3 billion' for hover info (all rows at once)
+    dfsoilMeans['humanPop'] = humanformat.intword(dfsoilMeans['Reporter_Country_pop_est'])
+    return dfsoilMeans.reset_index(drop=True)
+
+
+# quantity names the exported tonnes column: 2019's in dffood, or tradestore's for its stores of each year
+def food_partner_totals(dffood, quantity='Export_Quantity_2019_Value_tonnes'):
+    # one row per Partner (importing) Country with the sum total of exported tonnes and the distinct count of exported items
+    dffoodPartners = dffood.groupby('Partner_Country_name', observed=True, sort=False).agg(
+        Export_Quantity_Sum=(quantity, 'sum'),
+        Export_Items_Count=('Item', 'nunique'),
+    ).reset_index()
+    # make numbers into a more human readable format, e.g., transform 12345591313 to '12.3 billion' for hover info (all rows at once)
+    dffoodPartners['tradeVolume'] = humanformat.intword(dffoodPartners['Export_Quantity_Sum'])
+    return dffoodPartners
+
+
+def soil_world_bins(dfsoil):
+    # every country's soil points binned together at each coarser level of detail (not level 0, the points themselves),
+    # one row per grid cell with its level and the mean position and mean SOCD of its points, for the world overview map
+    lon, lat, socd = (dfsoil[column].to_numpy() for column in ('Reporter_Country_lon', 'Reporter_Country_lat', 'Reporter_Country_SOCD_depth4_5'))
+    levels = []
+    for level in range(1, mapdetail.maxLevel + 1):
+        binLon, binLat, binSOCD = mapdetail.bin_points(lon, lat, socd, mapdetail.baseCellDegrees * 2 ** level)
+        levels.append(pd.DataFrame({'level': level, 'lon': binLon, 'lat': binLat, 'SOCDmean': binSOCD}))
+    return pd.concat(levels, ignore_index=True)
+
+
+# each summary, by artifact name, with the dataset it comes from and how to compute it
+summaries = {
+    'dfsoilMeans': ('dfsoil_subUSCN_prod.csv', soil_country_means),
+    'dffoodPartners': ('dffood.csv', food_partner_totals),
+    'dfsoilWorldBins': ('dfsoil_subUSCN_prod.csv', soil_world_bins),
+}
+
+
+def dataset_version(csvName):
+    csvPath = os.path.join(datastore.dataDir, csvName)
+    storePath = datastore.current_column_store(csvPath)
+    if storePath is not None:
+        return datastore.read_column_store_meta(storePath)['version']
+    return datastore.file_version(csvPath)
+
+
+def artifact_path(name):
+    return os.path.join(aggregatesDir, name + '.columns')
+
+
+def build(name, df=None):
+    csvName, summarize = summaries[name]
+    if df is None:
+        df = datastore.load_frame(csvName)
+    summary = summarize(df)
+    datastore.write_column_store(summary, artifact_path(name), dataset_version(csvName))
+    return summary
+
+
+# load a summary from its artifact when it was built from the current data, otherwise compute it here;
+# pass the dataset if it is already loaded, to save reading it again when computing
+def load(name, df=None):
+    csvName, summarize = summaries[name]
+    storePath = artifact_path(name)
+    if os.path.exists(os.path.join(storePath, 'meta.json')):
+        if datastore.read_column_store_meta(storePath)['version'] == dataset_version(csvName):
+            return datastore.read_column_store(storePath)
+    if df is None:
+        df = datastore.load_frame(csvName)
+    return summarize(df)
+
+
+if __name__ == '__main__':
+    for name in summaries:
+        summary = build(name)
+        print('built %s: %d rows' % (name, len(summary)))
@@ -3,13 +3,26 @@
 
 # import the required packages using their usual aliases
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-import humanize
 import os
+import base64
+import hashlib
+import numpy as np
+from functools import lru_cache, partial
+from flask import jsonify, request
+from flask_compress import Compress
+# the app's own data loading and map helpers
+import datastore
+import aggregates
+import mapdetail
+import pointindex
+import reports
+import warmup
+import instrumentation
+import tradestore
 
 # read token string with your access mapbox token from a hidden file
 # saved in environment's root directory same as where this app.py file is
@@ -17,23 +30,57 @@ import os
 # to prevent your private credentials from being publicly viewed or uploaded to GitHub
 mapbox_access_token = os.environ.get('MAPBOX_ACCESS_TOKEN')
 
+# clientside map mode (set MAP_CLIENTSIDE=1) sends each country's soil points to the browser once, the first time it is chosen,
+# and the browser builds the map itself whenever the country is changed; by default the server builds and sends each map
+mapClientside = os.environ.get('MAP_CLIENTSIDE', '0') == '1'
+
+# rounded map points (set MAP_ROUNDED_POINTS=1) sends the map's lon and lat to 4 decimals (about 10 m, far finer than the 5 arc-minute
+# grid, so every point stays in its own grid cell) and SOCD to 2 decimals, instead of every digit of each float, which makes the map's
+# JSON much smaller; the clientside map mode packs its points to the same decimals
+mapRoundedPoints = os.environ.get('MAP_ROUNDED_POINTS', '0') == '1'
+pointDecimals = {'lon': 4, 'lat': 4, 'socd': 2}
+
+# lazy tabs mode (set SOIL_LAZY_TABS=1) builds the charts under the tabs, and loads the data they need, the first time each tab
+# is shown rather than when the app starts, so a new worker can serve its first page sooner; by default they are built at startup
+lazyTabs = os.environ.get('SOIL_LAZY_TABS', '0') == '1'
+
 # ----------------------------------------------------------------------------------------
 # -- call the data
 # -- read the food trade matrix data into pandas from CSV file of 2019 export quantities (exported from analysis in Jupyter Notebook)
 # prepared using original dataset FAOSTAT Detailed trade matrix: All Data Normalized from https://fenixservices.fao.org/faostat/static/bulkdownloads/Trade_DetailedTradeMatrix_E_All_Data_(Normalized).zip
 # with appended key demographics from FAOSTAT Key dataset (in Jupyter Notebook)
 # # full dataset
-dffood = pd.read_csv('./data/dffood.csv')
+# -- only its per partner country summary is used, loaded from the artifact made by `python aggregates.py` when it matches
+# the data (read with the FOOD TRADE graph below); the trade matrix itself is only read when that summary must be computed here
 
 # -- read the 4.5 depth soil organic carbon density (%) measurements pre-filtered for audience China's and U.S.'s food's trade export Reporter Countries (exported from analysis in Jupyter Notebook)
 # prepared using original dataset Soil organic carbon density: SOCD5min.zip from http://globalchange.bnu.edu.cn/research/soilw
 # with appended country name and ISO3 code from GeoPandas embedded World dataset
-dfsoil = pd.read_csv('./data/dfsoil_subUSCN_prod.csv')
+# -- loaded from its typed column files made by `python datastore.py` when they exist, or else from the CSV
+with instrumentation.stage('load_soil'):
+    dfsoil = datastore.load_frame('dfsoil_subUSCN_prod.csv')
+
+# -- index the soil points by country once at startup, so the map callback can look up a country's points
+# instead of scanning the whole dataframe on every dropdown change
+# datastore returns the rows grouped by country (in their original order within each country) so each country is one slice
+# pull the columns the map needs out as plain numpy arrays, which are memory-mapped when loaded from the typed column files;
+# slicing these makes views, not copies
+soilLon = dfsoil['Reporter_Country_lon'].to_numpy()
+soilLat = dfsoil['Reporter_Country_lat'].to_numpy()
+soilSOCD = dfsoil['Reporter_Country_SOCD_depth4_5'].to_numpy()
+# map each country name to its (lon, lat, SOCD) array slices
+soilCountryIndex = {}
+with instrumentation.stage('index_soil'):
+    for country, rows in dfsoil.groupby('Reporter_Country_name', sort=True).indices.items():
+        countryRows = slice(rows[0], rows[-1] + 1)
+        soilCountryIndex[country] = (soilLon[countryRows], soilLat[countryRows], soilSOCD[countryRows])
 
 # ----------------------------------------------------------------------------------------
 # create (instantiate) the app,
 # using the Bootstrap MORPH theme, Slate (dark) or Flatly (light) theme or Darkly (its dark counterpart) to align with my llc website in development with Flatly (dadeda.design)
+# (in lazy tabs mode, callbacks may name components inside tabs that have not been built yet)
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.MORPH],
+                suppress_callback_exceptions=lazyTabs,
                 meta_tags=[{'name': 'viewport',
                             # initial-scale is the initial zoom on each device on load
                             'content': 'width=device-width, initial-scale=1.0, maximum-scale=1.2, minimum-scale=0.5'}]
@@ -42,6 +89,43 @@ app = dash.Dash(__name__, external_stylesheets=[dbc.themes.MORPH],
 server = app.server
 app.title = 'Sustain-Our-Soil-for-Our-Food'
 
+# compress responses (the page layout, and the map's JSON in particular) with brotli, or gzip for browsers without it
+# the levels trade server CPU for smaller responses; responses smaller than COMPRESS_MIN_SIZE bytes are sent as they are
+server.config.update(
+    COMPRESS_ALGORITHM=os.environ.get('COMPRESS_ALGORITHM', 'br,gzip').split(','),
+    COMPRESS_BR_LEVEL=int(os.environ.get('COMPRESS_BR_LEVEL', 4)),
+    COMPRESS_LEVEL=int(os.environ.get('COMPRESS_LEVEL', 6)),  # gzip
+    COMPRESS_MIN_SIZE=int(os.environ.get('COMPRESS_MIN_SIZE', 500)),
+)
+Compress(server)
+
+# the initial layout only changes with the app's code or data, so browsers may keep it as long as they check it is current:
+# it is tagged with a hash of its contents, and a request already holding that tag gets an empty 304 Not Modified reply
+# (a weak tag, since the compressed bytes differ by encoding while the layout is the same)
+layoutETag = None
+
+
+@server.before_request
+def layout_not_modified():
+    if request.path == app.config.routes_pathname_prefix + '_dash-layout' and layoutETag is not None:
+        if request.if_none_match.contains_weak(layoutETag):
+            notModified = server.response_class(status=304)
+            notModified.set_etag(layoutETag, weak=True)
+            notModified.cache_control.no_cache = True
+            return notModified
+
+
+# registered after Compress(server), so it runs before compression and tags the uncompressed layout
+@server.after_request
+def tag_layout(response):
+    global layoutETag
+    if request.path == app.config.routes_pathname_prefix + '_dash-layout' and response.status_code == 200:
+        if layoutETag is None:
+            layoutETag = hashlib.sha1(response.get_data()).hexdigest()
+        response.set_etag(layoutETag, weak=True)
+        response.cache_control.no_cache = True
+    return response
+
 # ----------------------------------------------------------------------------------------
 # named variables for the app's layout
 navbar = dbc.NavbarSimple(
@@ -189,6 +273,15 @@ dropdownReporterCountry = dbc.CardBody(
     ])
 )
 
+# the map, with its figure set by the callbacks below
+mapGraph = dcc.Graph(id='map-socd-graph', config={'displayModeBar': True, 'scrollZoom': True})
+
+# SOCD stats of the soil points in a box or lasso selected on the map, or around a clicked point, set by a callback below
+mapSelectionStats = html.Div(id='map-selection-stats', style={'text-align': 'left'})
+
+# in clientside map mode, the country the browser needs points for, the server's reply, and the points the browser has so far
+mapStores = [dcc.Store(id='soil-points-request'), dcc.Store(id='soil-points-chunk'), dcc.Store(id='soil-points-cache', data={})] if mapClientside else []
+
 controls = html.Div(children=[
     dbc.CardGroup([dropdownReporterCountry, tooltip], class_name="card border-primary bg-light mb-2")
     ]
@@ -204,8 +297,11 @@ mapExplorer = dbc.Card([
         # html.Div(id='map-socd',
         #          ),
         # add a loading spinner to the map
-        dbc.Spinner(id='map-socd', size="lg", color="primary", type="border", fullscreen=False
-                 ),
+        dbc.Spinner(mapGraph,
+                    id='map-socd', size="lg", color="primary", type="border", fullscreen=False
+                    ),
+        mapSelectionStats,
+        html.Div(mapStores),
     ]),
     html.Br(),
 
@@ -227,148 +323,206 @@ mapExplorer = dbc.Card([
 ], body=True)
 
 # --------------------------SOIL BAR graph--------------------------
-# take the mean SOCD by grouping soil dataframe by Country and append the mean as a column
-dfsoil['SOCDcountryMean'] = dfsoil['Reporter_Country_SOCD_depth4_5'].groupby(dfsoil['Reporter_Country_name']).transform('mean')
-# drop the raw SOCD values from the subset of soil data; used in density ranges bar chart
-dfsoilMeans = dfsoil.drop_duplicates(subset=['Reporter_Country_name', 'Reporter_Country_continent', 'SOCDcountryMean', 'Reporter_Country_pop_est']).drop(['Reporter_Country_SOCD_depth4_5'], axis=1).sort_values(by=['SOCDcountryMean', 'Reporter_Country_continent', 'Reporter_Country_name'], ascending=(False, True, True))
-dfsoilMeansMaxOrder = ['Africa', 'Oceania', 'South America', 'Asia', 'North America', 'Europe']
-# make numbers into a more human readable format, e.g., transform 12345591313 to '12.3 billion' for hover info
-dfsoilMeans['humanPop'] = dfsoilMeans['Reporter_Country_pop_est'].apply(lambda x: humanize.intword(x))
-
-# make a bar chart showing range of mean by countries, overlay countries within continent group to retain mean y axis levels
-rangeSOCDfig = px.bar(dfsoilMeans, x='Reporter_Country_continent', y='SOCDcountryMean', color='SOCDcountryMean', barmode='overlay',
-                      # set bolded title in hover text, and make a list of columns to customize how they appear in hover text
-                      custom_data=['Reporter_Country_name',
-                                   'Reporter_Country_continent',
-                                   'SOCDcountryMean',
-                                   'humanPop'
-                                   ],
-                      color_continuous_scale=px.colors.sequential.speed,  # alternately use turbid for more muted yellows to browns (speed for yellow to green to black scale)
-                      # a better label that will display over color legend
-                      labels={'SOCDcountryMean': 'Avg.<br>SOCD'},
-                      # lower opacity to help see variations of color between countries as means change
-                      opacity=0.20
-                      )
-# sort bars by mean SOCD, and suppress redundant axis titles, instead of xaxis={'categoryorder': 'mean ascending'} I pre-sorted the dataframe above, but still force sort here by explicit names
-rangeSOCDfig.update_layout(xaxis={'categoryorder': 'array', 'categoryarray': dfsoilMeansMaxOrder},
-                           xaxis_title=None, yaxis_title=None,  # removed xaxis_tickangle=-45, # used to angle longer/more xaxis labels
-                           paper_bgcolor='#e8ece8',  # next tint variation up from a low tint of #dadeda
-                           plot_bgcolor='#f7f5fc',  # violet tone of medium purple to help greens pop forward
-                           yaxis={'gridcolor': '#e8ece8'},  # match grid lines shown to background to appear as showing through
-                           font={'color': '#483628'})  # a dark shade of orange that appears dark brown
-rangeSOCDfig.update_traces(
-    hovertemplate="<br>".join([
-        "<b>%{customdata[0]} </b><br>",  # bolded hover title included, since the separate hover_name is superseced by hovertemplae
-        "%{customdata[1]}",  # Continent value with no label
-        "Average SOCD: %{customdata[2]:.1f} t ha<sup>−1</sup>",  # with html <sup> superscript tag in abbr. metric tonnes per hectare (t ha-1) t ha<sup>−1</sup> formatted to 2 decimals
-        "Estimated Population (2019): %{customdata[3]} people"  # in humanized format
-    ])
-)
+# the mean SOCD of each Country, one row per country sorted by mean, with a human readable population for hover info
+# (precomputed by `python aggregates.py`, or computed here from the soil dataframe when that is missing or out of date)
+@lru_cache(maxsize=1)
+def soil_means():
+    with instrumentation.stage('load_dfsoilMeans'):
+        return aggregates.load('dfsoilMeans', dfsoil)
+
+
+# built by a function, so in lazy tabs mode it is only built (once) when its tab is first shown
+@lru_cache(maxsize=None)
+def build_density_ranges():
+    import plotly.express as px
+
+    dfsoilMeans = soil_means()
+    dfsoilMeansMaxOrder = ['Africa', 'Oceania', 'South America', 'Asia', 'North America', 'Europe']
+
+    # make a bar chart showing range of mean by countries, overlay countries within continent group to retain mean y axis levels
+    with instrumentation.stage('build_rangeSOCDfig'):
+        rangeSOCDfig = px.bar(dfsoilMeans, x='Reporter_Country_continent', y='SOCDcountryMean', color='SOCDcountryMean', barmode='overlay',
+                              # set bolded title in hover text, and make a list of columns to customize how they appear in hover text
+                              custom_data=['Reporter_Country_name',
+                                           'Reporter_Country_continent',
+                                           'SOCDcountryMean',
+                                           'humanPop'
+                                           ],
+                              color_continuous_scale=px.colors.sequential.speed,  # alternately use turbid for more muted yellows to browns (speed for yellow to green to black scale)
+                              # a better label that will display over color legend
+                              labels={'SOCDcountryMean': 'Avg.<br>SOCD'},
+                              # lower opacity to help see variations of color between countries as means change
+                              opacity=0.20
+                              )
+    # sort bars by mean SOCD, and suppress redundant axis titles, instead of xaxis={'categoryorder': 'mean ascending'} I pre-sorted the dataframe above, but still force sort here by explicit names
+    rangeSOCDfig.update_layout(xaxis={'categoryorder': 'array', 'categoryarray': dfsoilMeansMaxOrder},
+                               xaxis_title=None, yaxis_title=None,  # removed xaxis_tickangle=-45, # used to angle longer/more xaxis labels
+                               paper_bgcolor='#e8ece8',  # next tint variation up from a low tint of #dadeda
+                               plot_bgcolor='#f7f5fc',  # violet tone of medium purple to help greens pop forward
+                               yaxis={'gridcolor': '#e8ece8'},  # match grid lines shown to background to appear as showing through
+                               font={'color': '#483628'})  # a dark shade of orange that appears dark brown
+    rangeSOCDfig.update_traces(
+        hovertemplate="<br>".join([
+            "<b>%{customdata[0]} </b><br>",  # bolded hover title included, since the separate hover_name is superseced by hovertemplae
+            "%{customdata[1]}",  # Continent value with no label
+            "Average SOCD: %{customdata[2]:.1f} t ha<sup>−1</sup>",  # with html <sup> superscript tag in abbr. metric tonnes per hectare (t ha-1) t ha<sup>−1</sup> formatted to 2 decimals
+            "Estimated Population (2019): %{customdata[3]} people"  # in humanized format
+        ])
+    )
 
 
-densityRanges = dbc.Card([
-    html.Div(children=[
-        html.H5("Range of Average Soil Organic Carbon Density (SOCD) Worldwide"
-                ),
-        dcc.Graph(figure=rangeSOCDfig,
-                  id="SOCD-bar-chart",
-                  config={'displayModeBar': True, 'scrollZoom': True}
-                  )
-    ]),
-    html.Br(),
+    densityRanges = dbc.Card([
+        html.Div(children=[
+            html.H5("Range of Average Soil Organic Carbon Density (SOCD) Worldwide"
+                    ),
+            dcc.Graph(figure=rangeSOCDfig,
+                      id="SOCD-bar-chart",
+                      config={'displayModeBar': True, 'scrollZoom': True}
+                      )
+        ]),
+        html.Br(),
+
+        html.Div(children=[
+            html.P("Bars show the range of soil organic carbon density on land as a mean average within each country in metric tonnes per hectare (t ha-1), which are equal to about 1,000 kilograms or aproximately 2,205 pounds. Hover over any bar to view details for specific countries.",
+                   style={'text-align': 'left'}),
+            html.P(children=[
+                "Data source: Shangguan, W., Dai, Y., Duan, Q., Liu, B. and Yuan, H., 2014. A Global Soil Data Set for Earth System Modeling. Journal of Advances in Modeling Earth Systems, ",
+                html.A("6: 249-263.",
+                       href='https://agupubs.onlinelibrary.wiley.com/doi/full/10.1002/2013MS000293',
+                       target='_blank'  # opens link in new tab or window
+                       )
+                ],
+                   style={'text-align': 'left'}),
+        ]),
+        html.Br()
+    ], body=True)
+    return densityRanges
 
-    html.Div(children=[
-        html.P("Bars show the range of soil organic carbon density on land as a mean average within each country in metric tonnes per hectare (t ha-1), which are equal to about 1,000 kilograms or aproximately 2,205 pounds. Hover over any bar to view details for specific countries.",
-               style={'text-align': 'left'}),
-        html.P(children=[
-            "Data source: Shangguan, W., Dai, Y., Duan, Q., Liu, B. and Yuan, H., 2014. A Global Soil Data Set for Earth System Modeling. Journal of Advances in Modeling Earth Systems, ",
-            html.A("6: 249-263.",
-                   href='https://agupubs.onlinelibrary.wiley.com/doi/full/10.1002/2013MS000293',
-                   target='_blank'  # opens link in new tab or window
-                   )
-            ],
-               style={'text-align': 'left'}),
-    ]),
-    html.Br()
-], body=True)
 
 # --------------------------FOOD TRADE graph--------------------------
-
-# take the sum total of exported tonnes by grouping food dataframe by Partner (importing) Country and append the sum as a column
-dffood['Export_Quantity_Sum'] = dffood['Export_Quantity_2019_Value_tonnes'].groupby(dffood['Partner_Country_name']).transform('sum')
-# take the distinct count of exported items by grouping food dataframe by Reporter (exporting) Country and append the count as a column
-dffood['Export_Items_Count'] = dffood['Item'].groupby(dffood['Partner_Country_name']).transform('nunique')
-# make numbers into a more human readable format, e.g., transform 12345591313 to '12.3 billion' for hover info
-dffood['tradeVolume'] = dffood['Export_Quantity_Sum'].apply(lambda x: humanize.intword(x))
-
-
-# food data scatterplot points
-RiskFoodsFig = px.scatter(dffood, x='Export_Items_Count', y='Export_Quantity_Sum', size='Export_Quantity_Sum',
-                          custom_data=['Partner_Country_name',  # 'Reporter_Country_name_x',
-                                       'Export_Quantity_Sum',
-                                       'Export_Items_Count'
-                                       ]
-                          )
-
-# sort bars by mean SOCD, and suppress redundant axis titles, instead of xaxis={'categoryorder': 'mean ascending'} I pre-sorted the dataframe above, but still force sort here by explicit names
-RiskFoodsFig.update_layout(
-                           xaxis_title='Diversity of Foods Imported (How many unique items?)',  # Exported (How many unique items?)',
-                           # move yaxis text to title area for readability; add empty line above it so it appears below the plotly toolbar options
-                           title={
-                               'text': 'Volume as Total Quantity of Foods Imported (tonnes)',
-                               'xref': 'container',
-                           },
-                           yaxis_title='',  # moved to title attribute for readability
-                           paper_bgcolor='#e8ece8',  # next tint variation up from a low tint of #dadeda
-                           plot_bgcolor='#f7f5fc',  # violet tone of medium purple to help greens pop forward
-                           yaxis={'gridcolor': '#e8ece8'},  # match grid lines shown to background to appear as showing through
-                           font={'color': '#483628'})  # a dark shade of orange that appears dark brown
-RiskFoodsFig.update_traces(
-    # hard code single point color
-    marker=dict(
-        color='#a99e54',
-        sizemin=10
-    ),
-    # set bolded title in hover text, and make a list of columns to customize how they appear in hover text
-    hovertemplate="<br>".join([
-        "<b>%{customdata[0]} </b><br>",  # bolded hover title included, since the separate hover_name is superseced by hovertemplae
-        "Trade Volume: %{customdata[1]:,} tonnes imported",  # %{customdata[2]:,} tonnes exported", # note html tags can be used in string; comma sep formatted; note with tradeVolume use format .1f to 1 decimals
-        "Trade Diversity: %{customdata[2]:} unique food products imported"  # %{customdata[3]:} unique food products exported",
+# the years of food trade data stored by `python tradestore.py` from the FAOSTAT bulk download, oldest first; when there are any
+# the chart gets a year selector and starts on the latest year, and otherwise it shows dffood's 2019 exports
+tradeYears = tradestore.years()
+
+
+# one row per Partner (importing) Country, with the sum total of exported tonnes, the distinct count of exported items,
+# and a human readable trade volume, so each country is drawn as a single point rather than once per item traded
+@lru_cache(maxsize=None)
+def food_partners(year=None):
+    if year is None:
+        # (precomputed by `python aggregates.py`, or computed here from the food trade matrix when that is missing or out of date)
+        with instrumentation.stage('load_dffoodPartners'):
+            return aggregates.load('dffoodPartners')
+    with instrumentation.stage('load_trade_year'):
+        return aggregates.food_partner_totals(tradestore.load_year(year), quantity=tradestore.quantityColumn)
+
+
+# the chart for one year's trade (or dffood's when year is None), built once per year
+@lru_cache(maxsize=None)
+def build_risk_foods_figure(year=None):
+    import plotly.express as px
+
+    dffoodPartners = food_partners(year)
+
+    # food data scatterplot points
+    # built from the per partner summary so the figure carries one point per country; only the country name goes in custom_data
+    # since the hover text can read the trade sum and item count straight from each point's y and x values
+    with instrumentation.stage('build_RiskFoodsFig'):
+        RiskFoodsFig = px.scatter(dffoodPartners, x='Export_Items_Count', y='Export_Quantity_Sum', size='Export_Quantity_Sum',
+                                  custom_data=['Partner_Country_name',  # 'Reporter_Country_name_x',
+                                               ]
+                                  )
+
+    # sort bars by mean SOCD, and suppress redundant axis titles, instead of xaxis={'categoryorder': 'mean ascending'} I pre-sorted the dataframe above, but still force sort here by explicit names
+    RiskFoodsFig.update_layout(
+                               xaxis_title='Diversity of Foods Imported (How many unique items?)',  # Exported (How many unique items?)',
+                               # move yaxis text to title area for readability; add empty line above it so it appears below the plotly toolbar options
+                               title={
+                                   'text': 'Volume as Total Quantity of Foods Imported (tonnes)',
+                                   'xref': 'container',
+                               },
+                               yaxis_title='',  # moved to title attribute for readability
+                               paper_bgcolor='#e8ece8',  # next tint variation up from a low tint of #dadeda
+                               plot_bgcolor='#f7f5fc',  # violet tone of medium purple to help greens pop forward
+                               yaxis={'gridcolor': '#e8ece8'},  # match grid lines shown to background to appear as showing through
+                               font={'color': '#483628'})  # a dark shade of orange that appears dark brown
+    RiskFoodsFig.update_traces(
+        # hard code single point color
+        marker=dict(
+            color='#a99e54',
+            sizemin=10
+        ),
+        # set bolded title in hover text, and make a list of columns to customize how they appear in hover text
+        hovertemplate="<br>".join([
+            "<b>%{customdata[0]} </b><br>",  # bolded hover title included, since the separate hover_name is superseced by hovertemplae
+            "Trade Volume: %{y:,} tonnes imported",  # %{customdata[2]:,} tonnes exported", # note html tags can be used in string; comma sep formatted; note with tradeVolume use format .1f to 1 decimals
+            "Trade Diversity: %{x} unique food products imported"  # %{customdata[3]:} unique food products exported",
+        ])
+    )
+    return RiskFoodsFig
+
+
+@lru_cache(maxsize=None)
+def build_risk_foods():
+    # choose which year's trade to show, when the trade store has any
+    yearSelector = []
+    if tradeYears:
+        yearSelector = [
+            dbc.Label('Choose a year.', style={'text-align': 'left'}),
+            dcc.Dropdown(id='trade-year-dropdown',
+                         options=[{'label': str(year), 'value': year} for year in reversed(tradeYears)],
+                         value=tradeYears[-1],
+                         clearable=False,
+                         style={"width": "50%"}
+                         ),
+        ]
+
+    riskFoods = dbc.Card([
+        html.Div(children=[
+            html.H5("Food Security Risk Analysis by Volume & Diversity of Food Trade Reliance"
+                    ),
+            html.Div(yearSelector),
+            dcc.Graph(figure=build_risk_foods_figure(tradeYears[-1] if tradeYears else None),
+                      id="food-quadrant-chart",
+                      config={'displayModeBar': True, 'scrollZoom': True}
+                      )
+        ]),
+        html.Br(),
+
+        html.Div(children=[
+            html.P("Points show where each country falls in relation to these two major trade metrics as indicators of risk for a country's ability to feed its population. Countries in the upper right corner can generally be understood to be most at risk if food trade lines are affected by decreased production.",
+                   style={'text-align': 'left'}),
+            html.P("All food products traded between countries are included in the total summary of items imported, in %s, as measured in metric tonnes (vertical axis showing range with M representing millions of tonnes). While soil organic carbon content is a major factor determining agricultural productivity, those levels are not directly shown in this graph and there are many factors that can lead to trade volatility" % ('the year chosen' if tradeYears else 2019),  # The major grid lines dividing the four sections are set at the median, in other words the middle, of that range of global values as a benchmark to divide high or low in population and trade dependency, in relation to other countries.",
+                   style={'text-align': 'left'}),
+            html.P(children=["Food and Agriculture Organization of the United Nations. (2020). FAOSTAT Detailed trade matrix: All Data Normalized. ",
+                             html.A('https://www.fao.org/faostat/en/#data/TM',
+                                    href='https://www.fao.org/faostat/en/#data/TM',
+                                    target="_blank"  # opens link in new tab or window
+                                    )
+                             ],
+                   style={'text-align': 'left'}
+                   )
+        ]),
+        html.Br()
+    ], body=True)
+    return riskFoods
+
+
+# in lazy tabs mode the tabs start empty, and each one's content is built by a callback the first time it is chosen
+if lazyTabs:
+    tabs = html.Div([
+        dbc.Tabs(id='tabs', active_tab='density-ranges', children=[
+            dbc.Tab(label="Density Ranges", tab_id='density-ranges'),
+            dbc.Tab(label="At Risk Foods", tab_id='risk-foods'),
+            dbc.Tab(label="Why Carbon?", tab_id='why-carbon'),
+        ]),
+        html.Div(id='tab-content'),
     ])
-)
-
-riskFoods = dbc.Card([
-    html.Div(children=[
-        html.H5("Food Security Risk Analysis by Volume & Diversity of Food Trade Reliance"
-                ),
-        dcc.Graph(figure=RiskFoodsFig,
-                  id="food-quadrant-chart",
-                  config={'displayModeBar': True, 'scrollZoom': True}
-                  )
-    ]),
-    html.Br(),
-
-    html.Div(children=[
-        html.P("Points show where each country falls in relation to these two major trade metrics as indicators of risk for a country's ability to feed its population. Countries in the upper right corner can generally be understood to be most at risk if food trade lines are affected by decreased production.",
-               style={'text-align': 'left'}),
-        html.P("All food products traded between countries are included in the total summary of items imported, in 2019, as measured in metric tonnes (vertical axis showing range with M representing millions of tonnes). While soil organic carbon content is a major factor determining agricultural productivity, those levels are not directly shown in this graph and there are many factors that can lead to trade volatility",  # The major grid lines dividing the four sections are set at the median, in other words the middle, of that range of global values as a benchmark to divide high or low in population and trade dependency, in relation to other countries.",
-               style={'text-align': 'left'}),
-        html.P(children=["Food and Agriculture Organization of the United Nations. (2020). FAOSTAT Detailed trade matrix: All Data Normalized. ",
-                         html.A('https://www.fao.org/faostat/en/#data/TM',
-                                href='https://www.fao.org/faostat/en/#data/TM',
-                                target="_blank"  # opens link in new tab or window
-                                )
-                         ],
-               style={'text-align': 'left'}
-               )
-    ]),
-    html.Br()
-], body=True)
-
-tab1 = dbc.Tab([densityRanges], label="Density Ranges")
-tab2 = dbc.Tab([riskFoods], label="At Risk Foods")
-tab3 = dbc.Tab([whyCarbon], label="Why Carbon?")
-tabs = dbc.Tabs(children=[tab1, tab2, tab3])
+else:
+    tab1 = dbc.Tab([build_density_ranges()], label="Density Ranges")
+    tab2 = dbc.Tab([build_risk_foods()], label="At Risk Foods")
+    tab3 = dbc.Tab([whyCarbon], label="Why Carbon?")
+    tabs = dbc.Tabs(children=[tab1, tab2, tab3])
 
 
 # create the app's layout with the named variables
@@ -450,46 +604,14 @@ app.layout = dbc.Container(
 # connecting the Dropdown values to the graph
 
 
-# simple selection on country directly
-@app.callback(
-    Output('map-socd', 'children'),
-    [Input('reporter_country_dropdown', 'value')]
-)
-def update_selected_reporter_country(selected_reporter_country):
-    # always make a copy of any dataframe to use in the function
-    # define the subset of data that matches the selected values from both dropdown(s)
-    dfsoil_sub = dfsoil
-    # filter dataframe with geo points for single selection multi=False (default)
-    dfsoil_sub1 = dfsoil_sub[(dfsoil_sub['Reporter_Country_name'] == selected_reporter_country)]
-
-    # create figure variables for the graph object
-
-    locations = [go.Scattermapbox(
-        name='SOCD at Surface Depth to 4.5cm',
-        lon=dfsoil_sub1['Reporter_Country_lon'],
-        lat=dfsoil_sub1['Reporter_Country_lat'],
-        mode='markers',
-        marker=go.scattermapbox.Marker(
-                                       size=dfsoil_sub['Reporter_Country_SOCD_depth4_5'],
-                                       # add a sequential color scale based on shades of fuschia #ff00ff
-                                       # bright hues range for contrast to map background layer
-                                       # to more easily differentiate each separate point on map
-                                       color=dfsoil_sub['Reporter_Country_SOCD_depth4_5'],
-                                       colorscale='Agsunset_r',
-                                       # show a colorbar for this colorscale range
-                                       showscale=True,
-                                       colorbar=dict(title="SOCD"
-                                                     ),
-                                       opacity=0.8,  # float or integer range between 0 and 1
-                                       ),
-        hovertemplate="Longitude: %{lon}<br>" + "Latitude: %{lat}<br><extra></extra>"  # hide secondary tag with empty extra tag
-        )
-    ]
-
+# the map's layout, the same for a country's points and the world overview
+def map_layout(uirevision=None):
     # add a mapbox image layer below the data
-    layout = go.Layout(
+    return go.Layout(
                 # commented out uirevision to allow map to reset zoom level to default when selection is changed
                 # uirevision='foo',  # to preserve state of figure/map after callback activated
+                # (level of detail mode sets it to the country, so the map resets only when the selection is changed)
+                uirevision=uirevision,
                 # match background behind color legend to the page area graph sit on
                 paper_bgcolor='#e4ebf5',  # Morph theme card background color,
                 font=dict(color='#483628'),  # a dark shade of orange that appears dark brown
@@ -513,12 +635,287 @@ def update_selected_reporter_country(selected_reporter_country):
                 ]
     )
 
+
+# a map trace's values, rounded to their decimals in rounded map points mode
+def map_values(values, name):
+    return np.round(values, pointDecimals[name]) if mapRoundedPoints else values
+
+
+# build the map figure from only one country's points, so a response never carries other countries' data
+# socdRange fixes the color scale's ends, and uirevision keeps the map's zoom and position through updates with the same value
+def build_map_figure(countryLon, countryLat, countrySOCD, socdRange=(None, None), uirevision=None):
+    # create figure variables for the graph object
+    countrySOCD = map_values(countrySOCD, 'socd')
+
+    locations = [go.Scattermapbox(
+        name='SOCD at Surface Depth to 4.5cm',
+        lon=map_values(countryLon, 'lon'),
+        lat=map_values(countryLat, 'lat'),
+        mode='markers',
+        marker=go.scattermapbox.Marker(
+                                       # size and color use the same country's SOCD values as the lon and lat points
+                                       size=countrySOCD,
+                                       # add a sequential color scale based on shades of fuschia #ff00ff
+                                       # bright hues range for contrast to map background layer
+                                       # to more easily differentiate each separate point on map
+                                       color=countrySOCD,
+                                       colorscale='Agsunset_r',
+                                       cmin=socdRange[0],
+                                       cmax=socdRange[1],
+                                       # show a colorbar for this colorscale range
+                                       showscale=True,
+                                       colorbar=dict(title="SOCD"
+                                                     ),
+                                       opacity=0.8,  # float or integer range between 0 and 1
+                                       ),
+        hovertemplate="Longitude: %{lon}<br>" + "Latitude: %{lat}<br><extra></extra>"  # hide secondary tag with empty extra tag
+        )
+    ]
+
+    return {
+        'data': locations,
+        'layout': map_layout(uirevision)
+    }
+
+
+# build the world overview from binned means of every country's points, drawn as a density layer rather than a marker per bin
+def build_world_figure(binLon, binLat, binSOCD, socdRange=(None, None), uirevision=None):
+    overview = [go.Densitymapbox(
+        name='Average SOCD at Surface Depth to 4.5cm',
+        lon=map_values(binLon, 'lon'),
+        lat=map_values(binLat, 'lat'),
+        z=map_values(binSOCD, 'socd'),
+        radius=8,
+        colorscale='Agsunset_r',
+        zmin=socdRange[0],
+        zmax=socdRange[1],
+        colorbar=dict(title="SOCD"),
+        opacity=0.8,
+        hovertemplate="Longitude: %{lon:.2f}<br>" + "Latitude: %{lat:.2f}<br>" + "Average SOCD: %{z:.1f}<extra></extra>"
+    )]
+    return {
+        'data': overview,
+        'layout': map_layout(uirevision)
+    }
+
+
+# keep the most recently requested countries' finished map figures, as plain JSON-ready dicts, so repeat
+# selections (from any user of this worker) skip building and validating the plotly objects entirely
+# size it to hold every country (default) or set MAP_FIGURE_CACHE_SIZE lower to bound memory; least recently used are evicted first
+mapFigureCacheSize = int(os.environ.get('MAP_FIGURE_CACHE_SIZE', 64))
+
+
+# level of detail mode (set MAP_LEVEL_OF_DETAIL=1) sends binned means of a country's points at a resolution to suit the map's view,
+# updated as the map is zoomed or moved, and never more than MAP_MAX_POINTS points at once
+mapLevelOfDetail = os.environ.get('MAP_LEVEL_OF_DETAIL', '0') == '1'
+mapMaxPoints = int(os.environ.get('MAP_MAX_POINTS', 5000))
+
+# world overview mode (set MAP_WORLD_OVERVIEW=1) shows every country's SOCD while no country is chosen, as a density layer of
+# binned means at the finest level of detail with at most MAP_MAX_POINTS bins (finer within the view as the map is zoomed, in level
+# of detail mode), so the browser never gets the points themselves; the clientside map mode keeps its empty map instead
+mapWorldOverview = os.environ.get('MAP_WORLD_OVERVIEW', '0') == '1' and not mapClientside
+
+
+def country_points(selected_reporter_country):
+    # look up the pre-indexed geo points for single selection multi=False (default); no selection shows no points
+    noPoints = soilLon[:0]
+    return soilCountryIndex.get(selected_reporter_country, (noPoints, noPoints, noPoints))
+
+
+def known_country(selected_reporter_country):
+    # any name without soil points (e.g. a stale value restored by the dropdown's persistence) shows no points, and is looked up
+    # in the caches below as no country rather than taking a cache entry of its own from a real country
+    return selected_reporter_country if selected_reporter_country in soilCountryIndex else None
+
+
+# each country's points binned at every level of detail, made the first time the country is shown
+@lru_cache(maxsize=mapFigureCacheSize)
+def country_detail_levels(selected_reporter_country):
+    return mapdetail.detail_levels(*country_points(selected_reporter_country))
+
+
+def map_figure_for_view(selected_reporter_country, bounds):
+    selected_reporter_country = known_country(selected_reporter_country)
+    with instrumentation.stage('map_points'):
+        countryLon, countryLat, countrySOCD = country_points(selected_reporter_country)
+        # keep the colors of the points' SOCD consistent at every level of detail with the full range of the country's values
+        socdRange = (countrySOCD.min(), countrySOCD.max()) if len(countrySOCD) else (None, None)
+        viewLon, viewLat, viewSOCD = mapdetail.points_for_view(country_detail_levels(selected_reporter_country), bounds, mapMaxPoints)
+    with instrumentation.stage('map_build'):
+        figure = build_map_figure(viewLon, viewLat, viewSOCD, socdRange=socdRange, uirevision=selected_reporter_country)
+    return plain_figure(figure)
+
+
+# every country's points binned together at each level of detail, coarsest last like country_detail_levels (but without the
+# points themselves); precomputed by `python aggregates.py`, or binned here the first time the world overview is shown
+@lru_cache(maxsize=1)
+def world_detail_levels():
+    with instrumentation.stage('load_dfsoilWorldBins'):
+        dfsoilWorldBins = aggregates.load('dfsoilWorldBins', dfsoil)
+    return [tuple(rows[column].to_numpy() for column in ('lon', 'lat', 'SOCDmean'))
+            for _, rows in dfsoilWorldBins.groupby('level', sort=True)]
+
+
+def world_figure_for_view(bounds):
+    with instrumentation.stage('map_points'):
+        levels = world_detail_levels()
+        # color every view by the same range, that of the finest bins
+        finestSOCD = levels[0][2]
+        socdRange = (finestSOCD.min(), finestSOCD.max()) if len(finestSOCD) else (None, None)
+        viewLon, viewLat, viewSOCD = mapdetail.points_for_view(levels, bounds, mapMaxPoints)
+    with instrumentation.stage('map_build'):
+        figure = build_world_figure(viewLon, viewLat, viewSOCD, socdRange=socdRange, uirevision='world')
+    return plain_figure(figure)
+
+
+def plain_figure(figure):
+    # convert the plotly objects into the same plain dicts Dash would otherwise make on every response
+    with instrumentation.stage('map_serialize'):
+        return {
+            'data': [trace.to_plotly_json() for trace in figure['data']],
+            'layout': figure['layout'].to_plotly_json()
+        }
+
+
+@lru_cache(maxsize=mapFigureCacheSize)
+def cached_map_figure(selected_reporter_country):
+    if mapWorldOverview and selected_reporter_country is None:
+        return world_figure_for_view(None)
+    if mapLevelOfDetail:
+        # the whole country at the finest level of detail that fits
+        return map_figure_for_view(selected_reporter_country, None)
+    with instrumentation.stage('map_points'):
+        points = country_points(selected_reporter_country)
+    with instrumentation.stage('map_build'):
+        figure = build_map_figure(*points)
+    return plain_figure(figure)
+
+
+# report the map figure cache's hits, misses and size, to help choose MAP_FIGURE_CACHE_SIZE
+@server.route('/map-cache-info')
+def map_cache_info():
+    return jsonify(cached_map_figure.cache_info()._asdict())
+
+
+# simple selection on country directly, and in level of detail mode, the map's view after each zoom or move
+mapInputs = [Input('reporter_country_dropdown', 'value')]
+if mapLevelOfDetail:
+    mapInputs.append(Input('map-socd-graph', 'relayoutData'))
+
+
+def update_selected_reporter_country(selected_reporter_country, relayoutData=None):
+    selected_reporter_country = known_country(selected_reporter_country)
+    if mapLevelOfDetail and dash.callback_context.triggered[0]['prop_id'] == 'map-socd-graph.relayoutData':
+        bounds = mapdetail.view_bounds(relayoutData)
+        # nothing to update for relayouts that don't move the map (e.g. resizing)
+        if bounds is None:
+            raise PreventUpdate
+        if mapWorldOverview and selected_reporter_country is None:
+            return world_figure_for_view(bounds)
+        # or with no country selected
+        if selected_reporter_country is None:
+            raise PreventUpdate
+        return map_figure_for_view(selected_reporter_country, bounds)
+
     # Return figure
-    return dcc.Graph(config={'displayModeBar': True, 'scrollZoom': True},
-                     figure={
-                         'data': locations,
-                         'layout': layout
-                     })
+    warmup.record(selected_reporter_country)
+    return cached_map_figure(selected_reporter_country)
+
+
+# a country's points packed small for the browser: lon and lat to 4 decimals (about 10 m, far finer than the 5 arc-minute grid)
+# and SOCD to 2 decimals, each as whole numbers in a little-endian int32 array sent as base64 text
+pointScales = {name: 10 ** decimals for name, decimals in pointDecimals.items()}
+
+
+@lru_cache(maxsize=mapFigureCacheSize)
+def encoded_country_points(selected_reporter_country):
+    encoded = {'country': selected_reporter_country, 'scales': pointScales}
+    for name, values in zip(pointScales, country_points(selected_reporter_country)):
+        encoded[name] = base64.b64encode(np.round(values * pointScales[name]).astype('<i4').tobytes()).decode('ascii')
+    return encoded
+
+
+if mapClientside:
+    # the map starts empty, and its layout and styling are the template the browser fills with each country's points
+    mapGraph.figure = cached_map_figure(None)
+
+    # in the browser: ask the server for the chosen country's points, unless they were already loaded
+    app.clientside_callback(
+        ClientsideFunction(namespace='soilMap', function_name='requestPoints'),
+        Output('soil-points-request', 'data'),
+        [Input('reporter_country_dropdown', 'value')],
+        [State('soil-points-cache', 'data')]
+    )
+
+    @app.callback(
+        Output('soil-points-chunk', 'data'),
+        [Input('soil-points-request', 'data')]
+    )
+    def send_country_points(requested_country):
+        # nothing to send for no country, or a name without soil points
+        if known_country(requested_country) is None:
+            raise PreventUpdate
+        warmup.record(requested_country)
+        return encoded_country_points(requested_country)
+
+    # in the browser: keep newly loaded points, and draw the chosen country's points on the map
+    app.clientside_callback(
+        ClientsideFunction(namespace='soilMap', function_name='drawCountry'),
+        [Output('map-socd-graph', 'figure'), Output('soil-points-cache', 'data')],
+        [Input('reporter_country_dropdown', 'value'), Input('soil-points-chunk', 'data')],
+        [State('soil-points-cache', 'data'), State('map-socd-graph', 'figure')]
+    )
+else:
+    app.callback(
+        Output('map-socd-graph', 'figure'),
+        mapInputs
+    )(update_selected_reporter_country)
+
+# stats of the selected country's points in a box or lasso selection, or within MAP_CLICK_RADIUS_KM of a clicked point,
+# looked up in a grid bucket index of the country's points made the first time it is selected
+mapClickRadiusKilometres = float(os.environ.get('MAP_CLICK_RADIUS_KM', 50))
+
+
+@lru_cache(maxsize=mapFigureCacheSize)
+def country_point_index(selected_reporter_country):
+    return pointindex.GridIndex(*country_points(selected_reporter_country))
+
+
+def describe_selection(area, selectionStats):
+    if selectionStats['count'] == 0:
+        return html.P('No soil points %s.' % area)
+    return html.P([
+        '{:,} soil points {}: average SOCD {:.1f} t ha'.format(selectionStats['count'], area, selectionStats['mean']),
+        html.Sup('−1'),
+        ', ranging from {:.1f} to {:.1f}.'.format(selectionStats['min'], selectionStats['max']),
+    ])
+
+
+@app.callback(
+    Output('map-selection-stats', 'children'),
+    [Input('map-socd-graph', 'selectedData'), Input('map-socd-graph', 'clickData'), Input('reporter_country_dropdown', 'value')]
+)
+def show_selection_stats(selectedData, clickData, selected_reporter_country):
+    triggered = dash.callback_context.triggered[0]['prop_id']
+    # a newly chosen country (or none) clears the last selection's stats
+    if selected_reporter_country not in soilCountryIndex or triggered == 'reporter_country_dropdown.value':
+        return None
+    index = country_point_index(selected_reporter_country)
+    with instrumentation.stage('map_selection'):
+        if triggered == 'map-socd-graph.selectedData' and selectedData:
+            if selectedData.get('range', {}).get('mapbox'):
+                corners = np.asarray(selectedData['range']['mapbox'], dtype=float)
+                return describe_selection('in this box', index.box_stats(corners[:, 0].min(), corners[:, 1].min(),
+                                                                          corners[:, 0].max(), corners[:, 1].max()))
+            if selectedData.get('lassoPoints', {}).get('mapbox'):
+                return describe_selection('in this lasso', index.lasso_stats(selectedData['lassoPoints']['mapbox']))
+        if triggered == 'map-socd-graph.clickData' and clickData and clickData.get('points'):
+            point = clickData['points'][0]
+            return describe_selection('within {:g} km'.format(mapClickRadiusKilometres),
+                                      index.radius_stats(point['lon'], point['lat'], mapClickRadiusKilometres))
+    # a cleared selection clears its stats
+    return None
+
 
 # connect theLearn More button and modal with user interactions
 
@@ -533,9 +930,60 @@ def toggle_modal(n1, n2, is_open):
         return not is_open
     return is_open
 
+
+# in lazy tabs mode, show the chosen tab's content, built the first time any browser chooses it and kept for every later request
+tabBuilders = {'density-ranges': build_density_ranges, 'risk-foods': build_risk_foods, 'why-carbon': lambda: whyCarbon}
+
+if lazyTabs:
+    @app.callback(Output('tab-content', 'children'), Input('tabs', 'active_tab'))
+    def show_tab(active_tab):
+        if active_tab not in tabBuilders:
+            raise PreventUpdate
+        return tabBuilders[active_tab]()
+
+
+# show the chosen year's trade, when the trade store has years to choose from
+if tradeYears:
+    @app.callback(Output('food-quadrant-chart', 'figure'), Input('trade-year-dropdown', 'value'), prevent_initial_call=True)
+    def update_trade_year(year):
+        if year not in tradeYears:
+            raise PreventUpdate
+        return build_risk_foods_figure(year)
+
+# ----------------------------------------------------------------------------------------
+# each country's mean SOCD and food trade totals for scripts, as JSON or CSV at /api/country-reports (see reports.py),
+# read from a table built once per year rather than through the callbacks
+reports.register(server, soil_means, food_partners, tradeYears)
+
+# ----------------------------------------------------------------------------------------
+# prebuild what the first visitors to a new worker would otherwise wait for, in a background thread started once the worker
+# has loaded the app (see warmup.py and gunicorn.conf.py): the starting map every page asks for, any lazy tabs, then the most
+# often chosen countries' maps (ordered as the worker starts), as many as the figure cache holds
+warmup.configure([('map: (no country)', partial(cached_map_figure, None))]
+                 + [('tab: ' + tab, build) for tab, build in tabBuilders.items() if lazyTabs],
+                 sorted(soilCountryIndex), encoded_country_points if mapClientside else cached_map_figure,
+                 max(mapFigureCacheSize - 1, 0))
+
+
+# for load balancers and deploy checks: ready as soon as the worker serves requests, with how far warming up has got
+@server.route('/health')
+def health():
+    return jsonify(status='ok', warmup=warmup.progress())
+
+
+# ----------------------------------------------------------------------------------------
+# opt-in timings of the stages above, each callback and each response, served at /metrics (set SOIL_METRICS=1)
+instrumentation.gauges['soil_map_cache_hits'] = ('Map figure cache hits in this worker.', lambda: cached_map_figure.cache_info().hits)
+instrumentation.gauges['soil_map_cache_misses'] = ('Map figure cache misses in this worker.', lambda: cached_map_figure.cache_info().misses)
+instrumentation.gauges['soil_map_cache_size'] = ('Map figures held in this worker\'s cache.', lambda: cached_map_figure.cache_info().currsize)
+instrumentation.gauges['soil_warmup_done'] = ('Warm-up tasks finished in this worker.', lambda: warmup.state['done'])
+instrumentation.gauges['soil_warmup_total'] = ('Warm-up tasks to run in this worker.', lambda: warmup.state['total'])
+instrumentation.instrument(app)
+
 # ----------------------------------------------------------------------------------------
 # run the app
 
 
 if __name__ == '__main__':
+    warmup.start()
     app.run_server(debug=False)  # if inside Jupyter Notebook, add use_reloader=False inside parens to turn off reloader
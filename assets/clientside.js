@@ -0,0 +1,53 @@
+// ----------------------------------------------------------------------------------------
+// browser side of the clientside map mode (MAP_CLIENTSIDE=1 in app.py); Dash loads this file from the assets folder
+
+(function () {
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        soilMap: {
+            // ask the server for a country's points only the first time it is chosen
+            requestPoints: function (country, cache) {
+                if (!country || (cache && cache[country])) {
+                    return window.dash_clientside.no_update;
+                }
+                return country;
+            },
+
+            // keep a newly loaded country's points, then draw the chosen country from the points loaded so far
+            drawCountry: function (country, chunk, cache, figure) {
+                var noUpdate = window.dash_clientside.no_update;
+                var updatedCache = noUpdate;
+                if (chunk && chunk.country && !(cache && cache[chunk.country])) {
+                    updatedCache = Object.assign({}, cache);
+                    updatedCache[chunk.country] = chunk;
+                    cache = updatedCache;
+                }
+                var points = country ? cache && cache[country] : null;
+                if (country && !points) {
+                    // still waiting for this country's points from the server
+                    return [noUpdate, updatedCache];
+                }
+                var trace = Object.assign({}, figure.data[0]);
+                trace.lon = points ? decode(points.lon, points.scales.lon) : [];
+                trace.lat = points ? decode(points.lat, points.scales.lat) : [];
+                var socd = points ? decode(points.socd, points.scales.socd) : [];
+                trace.marker = Object.assign({}, trace.marker, {size: socd, color: socd});
+                return [{data: [trace], layout: figure.layout}, updatedCache];
+            }
+        }
+    });
+
+    // base64 text of little-endian int32 whole numbers back to the original values
+    function decode(base64, scale) {
+        var text = window.atob(base64);
+        var bytes = new Uint8Array(text.length);
+        for (var i = 0; i < text.length; i++) {
+            bytes[i] = text.charCodeAt(i);
+        }
+        var whole = new Int32Array(bytes.buffer);
+        var values = new Float64Array(whole.length);
+        for (var j = 0; j < whole.length; j++) {
+            values[j] = whole[j] / scale;
+        }
+        return values;
+    }
+})();
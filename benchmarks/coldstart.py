@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------------------------
+# time a new server process from start to its first served page, with and without lazy tabs (SOIL_LAZY_TABS)
+#
+# workers are restarted whenever gunicorn recycles them, so this startup is paid again and again, not just on deploys;
+# each run starts the app in a fresh process, waits for the first 200 from / and then times /_dash-layout and the first
+# callback the page makes for its tabs (in lazy mode, building the first tab's chart), and reports the median of the runs
+#
+# run from the repository root with e.g.:
+#     python benchmarks/coldstart.py --runs 5
+#     python benchmarks/coldstart.py --server gunicorn
+# the app reads its data from SOIL_DATA_DIR as usual; set it to a folder made by synthetic.py to try other sizes
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchmarksDir)
+sys.path.insert(0, benchmarksDir)
+import loadtest  # noqa: E402
+
+# the app served in its own process with the development server, without a line logged for every request
+serveScript = '''
+import logging, sys
+import app
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+app.server.run(host='127.0.0.1', port=int(sys.argv[1]))
+'''
+
+
+def start(server, port, lazy):
+    environment = dict(os.environ, SOIL_LAZY_TABS='1' if lazy else '0')
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'app:server', '--workers', '1', '--bind', '127.0.0.1:%d' % port]
+    else:
+        command = [sys.executable, '-c', serveScript, str(port)]
+    return subprocess.Popen(command, cwd=rootDir, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_page(baseUrl, process, seconds=600):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('the app exited with code %d before serving /' % process.returncode)
+        try:
+            urllib.request.urlopen(baseUrl + '/').read()
+            return
+        except OSError:
+            time.sleep(0.02)
+    raise RuntimeError('the app did not serve / within %d seconds' % seconds)
+
+
+def timed_get(url):
+    start = time.perf_counter()
+    urllib.request.urlopen(url).read()
+    return time.perf_counter() - start
+
+
+# the tab content callback the page sends first, when lazy tabs are on (None otherwise)
+def first_tab_seconds(baseUrl):
+    dependencies = loadtest.get_json(baseUrl + '/_dash-dependencies')
+    tabCallback = next((dependency for dependency in dependencies if dependency['output'] == 'tab-content.children'), None)
+    if tabCallback is None:
+        return None
+    body = loadtest.callback_body(tabCallback, ['density-ranges'], [])
+    return loadtest.post(baseUrl, body, 'identity')[0]
+
+
+def cold_start(server, port, lazy):
+    baseUrl = 'http://127.0.0.1:%d' % port
+    began = time.perf_counter()
+    process = start(server, port, lazy)
+    try:
+        wait_for_page(baseUrl, process)
+        firstPage = time.perf_counter() - began
+        layout = timed_get(baseUrl + '/_dash-layout')
+        firstTab = first_tab_seconds(baseUrl)
+        return firstPage, layout, firstTab
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='time the app from process start to its first served page')
+    parser.add_argument('--runs', type=int, default=3, help='cold starts to time in each mode')
+    parser.add_argument('--server', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('--port', type=int, default=8053)
+    options = parser.parse_args()
+
+    print('%-12s %16s %16s %16s' % ('mode', 'first / (s)', '_dash-layout (s)', 'first tab (s)'))
+    for lazy in (False, True):
+        runs = [cold_start(options.server, options.port, lazy) for _ in range(options.runs)]
+        firstPage, layout = np.median([run[:2] for run in runs], axis=0)
+        firstTab = '-' if runs[0][2] is None else '%.3f' % np.median([run[2] for run in runs])
+        print('%-12s %16.3f %16.3f %16s' % ('lazy tabs' if lazy else 'eager', firstPage, layout, firstTab))
@@ -0,0 +1,35 @@
+# ----------------------------------------------------------------------------------------
+# bytes on the wire for the page layout and map responses, uncompressed vs with gzip and brotli,
+# and for a repeat layout request that revalidates its ETag
+#
+# run from the repository root with:
+#     python benchmarks/compression.py [country ...]
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+encodings = ['identity', 'gzip', 'br']
+
+
+def map_request(client, country, encoding):
+    body = {'output': 'map-socd-graph.figure', 'outputs': {'id': 'map-socd-graph', 'property': 'figure'},
+            'inputs': [{'id': 'reporter_country_dropdown', 'property': 'value', 'value': country}],
+            'changedPropIds': ['reporter_country_dropdown.value'], 'state': []}
+    return client.post('/_dash-update-component', json=body, headers={'Accept-Encoding': encoding})
+
+
+if __name__ == '__main__':
+    client = app.server.test_client()
+    countries = sys.argv[1:] or sorted(app.soilCountryIndex)[:5]
+    print('%-32s' % 'response' + ''.join('%12s' % encoding for encoding in encodings))
+    layoutSizes = [len(client.get('/_dash-layout', headers={'Accept-Encoding': encoding}).data) for encoding in encodings]
+    print('%-32s' % '/_dash-layout' + ''.join('%12d' % size for size in layoutSizes))
+    for country in countries:
+        sizes = [len(map_request(client, country, encoding).data) for encoding in encodings]
+        print('%-32s' % ('map: ' + country[:26]) + ''.join('%12d' % size for size in sizes))
+    layout = client.get('/_dash-layout', headers={'Accept-Encoding': 'br'})
+    repeat = client.get('/_dash-layout', headers={'Accept-Encoding': 'br', 'If-None-Match': layout.headers['ETag']})
+    print('%-32s %d Not Modified, %d bytes' % ('/_dash-layout revalidated', repeat.status_code, len(repeat.data)))
@@ -0,0 +1,64 @@
+# ----------------------------------------------------------------------------------------
+# check humanformat.intword gives exactly what humanize.intword gives, then time both on a million rows
+#
+# run from the repository root with:
+#     python benchmarks/humanformat.py [rows]
+
+import os
+import sys
+import time
+
+import humanize
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import humanformat  # noqa: E402
+
+
+def check_values():
+    rng = np.random.default_rng(0)
+    # integers spread evenly over every order of magnitude, from 0 up to the largest 64 bit integers
+    integers = (10 ** rng.uniform(0, 18.9, 200000)).astype(np.int64)
+    # values on both sides of each rounding edge, e.g. 999,949 / 999,950 and 999,999,999,999
+    edges = []
+    for exponent in range(3, 16, 3):
+        for scale in (1, 999.94, 999.95, 999.96, 999.99, 1000):
+            middle = int(scale * 10 ** exponent)
+            edges.extend(range(middle - 3, middle + 4))
+    integers = np.concatenate([integers, np.array(edges, dtype=np.int64), -integers[:1000], [0, 1, 999, 1000, np.iinfo(np.int64).max]])
+    floats = np.concatenate([integers[:50000] + rng.uniform(0, 1, 50000), [np.nan, 1e19, 3.3e25, -5e20]])
+    return integers, floats
+
+
+def check():
+    failures = 0
+    for values in check_values():
+        expected = [humanize.intword(value) for value in values]
+        actual = humanformat.intword(values)
+        for value, want, got in zip(values, expected, actual):
+            same = (want == got) or (isinstance(want, float) and isinstance(got, float) and np.isnan(want) and np.isnan(got))
+            if not same:
+                failures += 1
+                if failures <= 10:
+                    print('mismatch for %r: humanize %r, humanformat %r' % (value, want, got))
+        print('checked %d %s values' % (len(values), values.dtype))
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check()
+    if failures:
+        sys.exit('%d values differ from humanize.intword' % failures)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    values = pd.Series((10 ** np.random.default_rng(1).uniform(0, 12, rows)).round())
+    start = time.perf_counter()
+    expected = values.apply(lambda x: humanize.intword(x))
+    applyTime = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = humanformat.intword(values)
+    vectorTime = time.perf_counter() - start
+    assert actual.equals(expected)
+    print('%d rows: Series.apply(humanize.intword) %.2fs, humanformat.intword %.2fs (%.1fx faster)'
+          % (rows, applyTime, vectorTime, applyTime / vectorTime))
@@ -0,0 +1,42 @@
+# ----------------------------------------------------------------------------------------
+# check the initial page layout stays within a size budget, since it is sent to (and rendered by) every visitor
+#
+# prints the serialized size of the whole layout and of each chart's figure in it, and exits with an error
+# when the layout is over the budget in bytes (100,000 by default, or set LAYOUT_BUDGET_BYTES)
+#
+# run from the repository root with:
+#     python benchmarks/layout_budget.py
+
+import json
+import os
+import sys
+
+import plotly
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+layoutBudgetBytes = int(os.environ.get('LAYOUT_BUDGET_BYTES', 100000))
+
+
+def serialized_size(value):
+    # the same encoder Dash uses for the /_dash-layout response
+    return len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8'))
+
+
+def graphs(component):
+    if getattr(component, 'figure', None) is not None:
+        yield component
+    children = getattr(component, 'children', None)
+    for child in children if isinstance(children, (list, tuple)) else [children]:
+        if hasattr(child, 'to_plotly_json'):
+            yield from graphs(child)
+
+
+if __name__ == '__main__':
+    for graph in graphs(app.app.layout):
+        print('%-28s %10d bytes' % (graph.id, serialized_size(graph.figure)))
+    layoutBytes = serialized_size(app.app.layout)
+    print('%-28s %10d bytes (budget %d)' % ('initial layout', layoutBytes, layoutBudgetBytes))
+    if layoutBytes > layoutBudgetBytes:
+        sys.exit('initial layout is %d bytes over its budget' % (layoutBytes - layoutBudgetBytes))
@@ -0,0 +1,37 @@
+# ----------------------------------------------------------------------------------------
+# compare startup data loading: parsing the CSVs vs reading the typed columns from `python datastore.py`
+#
+# run from the repository root (after converting the data) with:
+#     python benchmarks/load_data.py [repeats]
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import datastore  # noqa: E402
+
+
+def best_time(load, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('%-28s %12s %12s %8s' % ('dataset', 'csv (ms)', 'columns (ms)', 'speedup'))
+    for csvName in datastore.datasets:
+        csvPath = os.path.join(datastore.dataDir, csvName)
+        storePath = datastore.column_store_path(csvPath)
+        if not os.path.exists(os.path.join(storePath, 'meta.json')):
+            print('%-28s no converted columns; run `python datastore.py` first' % csvName)
+            continue
+        csvTime = best_time(lambda: pd.read_csv(csvPath), repeats)
+        storeTime = best_time(lambda: datastore.read_column_store(storePath), repeats)
+        print('%-28s %12.1f %12.1f %7.1fx' % (csvName, csvTime * 1000, storeTime * 1000, csvTime / storeTime))
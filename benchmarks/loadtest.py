@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------------------
+# load test the app's callbacks on synthetic data, to find where latency climbs before our traffic does
+#
+# for each data scale, writes synthetic datasets (see synthetic.py), starts the app on them, then replays
+# _dash-update-component POSTs the way browsers send them: mostly reporter_country_dropdown map selections
+# spread over the countries, and some toggle_modal clicks; it reports latency percentiles, throughput and response bytes
+#
+# run from the repository root with e.g.:
+#     python benchmarks/loadtest.py --scales 1 10 100 --concurrency 8 --requests 2000
+#     python benchmarks/loadtest.py --server gunicorn --workers 4 --columns
+# the app's own settings (MAP_LEVEL_OF_DETAIL, MAP_FIGURE_CACHE_SIZE, ...) are passed through from the environment
+
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchmarksDir)
+sys.path.insert(0, benchmarksDir)
+sys.path.insert(0, rootDir)
+import synthetic  # noqa: E402
+
+
+def get_json(url):
+    return json.loads(urllib.request.urlopen(url).read())
+
+
+def wait_until_up(baseUrl, seconds=600):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(baseUrl + '/').read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('the app did not start within %d seconds' % seconds)
+
+
+def find_component(node, componentId):
+    if isinstance(node, dict):
+        if node.get('props', {}).get('id') == componentId:
+            return node
+        node = list(node.values())
+    if isinstance(node, list):
+        for value in node:
+            found = find_component(value, componentId)
+            if found is not None:
+                return found
+    return None
+
+
+# the body Dash's renderer POSTs for a callback, from its entry in /_dash-dependencies and the input values
+def callback_body(dependency, inputValues, stateValues):
+    outputs = []
+    for output in dependency['output'].strip('.').split('...'):
+        componentId, prop = output.rsplit('.', 1)
+        outputs.append({'id': componentId, 'property': prop})
+    return {
+        'output': dependency['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': [dict(item, value=value) for item, value in zip(dependency['inputs'], inputValues)],
+        'state': [dict(item, value=value) for item, value in zip(dependency['state'], stateValues)],
+        'changedPropIds': ['%s.%s' % (dependency['inputs'][0]['id'], dependency['inputs'][0]['property'])],
+    }
+
+
+# a shuffled list of request bodies: map selections (a few countries are chosen far more often than others, like real
+# traffic) and modal toggles, in the proportion given
+def request_mix(baseUrl, count, modalShare, seed=0):
+    dependencies = get_json(baseUrl + '/_dash-dependencies')
+    layout = get_json(baseUrl + '/_dash-layout')
+    countries = [option['value'] for option in find_component(layout, 'reporter_country_dropdown')['props']['options']]
+    mapCallback = next(dependency for dependency in dependencies if dependency['output'].endswith('map-socd-graph.figure')
+                       and dependency['inputs'][0]['id'] == 'reporter_country_dropdown' and not dependency.get('clientside_function'))
+    modalCallback = next(dependency for dependency in dependencies if dependency['output'] == 'modal.is_open')
+    rng = random.Random(seed)
+    popularity = [1 / (rank + 1) for rank in range(len(countries))]
+    bodies = []
+    for _ in range(count):
+        if rng.random() < modalShare:
+            bodies.append(('toggle_modal', callback_body(modalCallback, [rng.randint(1, 5), 0], [False])))
+        else:
+            country = rng.choices(countries, weights=popularity)[0]
+            inputValues = [country] + [None] * (len(mapCallback['inputs']) - 1)
+            bodies.append(('reporter_country_dropdown', callback_body(mapCallback, inputValues, [None] * len(mapCallback['state']))))
+    return bodies
+
+
+def post(baseUrl, body, encoding):
+    request = urllib.request.Request(baseUrl + '/_dash-update-component', data=json.dumps(body).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json', 'Accept-Encoding': encoding})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        size = len(response.read())
+    return time.perf_counter() - start, size
+
+
+def replay(baseUrl, bodies, concurrency, encoding):
+    results = []
+    lock = threading.Lock()
+
+    def send(item):
+        name, body = item
+        seconds, size = post(baseUrl, body, encoding)
+        with lock:
+            results.append((name, seconds, size))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, bodies))
+    return results, time.perf_counter() - start
+
+
+def report(scale, results, elapsed):
+    print('scale %gx: %d requests in %.1fs, %.1f requests/s' % (scale, len(results), elapsed, len(results) / elapsed))
+    print('  %-28s %7s %9s %9s %9s %12s' % ('callback', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'mean bytes'))
+    for name in sorted({name for name, _, _ in results}):
+        seconds = np.array([second for callback, second, _ in results if callback == name]) * 1000
+        sizes = [size for callback, _, size in results if callback == name]
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+        print('  %-28s %7d %9.1f %9.1f %9.1f %12.0f' % (name, len(seconds), p50, p95, p99, np.mean(sizes)))
+
+
+def start_in_process(port):
+    # the app reads its settings and data when first imported, so only one scale can run in this process
+    import app
+    from werkzeug.serving import make_server
+    # without a line logged for every request
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def start_gunicorn(port, workers):
+    command = [sys.executable, '-m', 'gunicorn', 'app:server', '--preload', '--workers', str(workers),
+               '--bind', '127.0.0.1:%d' % port]
+    process = subprocess.Popen(command, cwd=rootDir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop():
+        process.terminate()
+        process.wait()
+    return stop
+
+
+def run_scale(scale, options):
+    with tempfile.TemporaryDirectory() as dataDir:
+        synthetic.write_datasets(dataDir, scale)
+        os.environ['SOIL_DATA_DIR'] = dataDir
+        if options.columns:
+            subprocess.run([sys.executable, 'datastore.py'], cwd=rootDir, check=True, stdout=subprocess.DEVNULL)
+            subprocess.run([sys.executable, 'aggregates.py'], cwd=rootDir, check=True, stdout=subprocess.DEVNULL)
+        if options.server == 'gunicorn':
+            stop = start_gunicorn(options.port, options.workers)
+        else:
+            os.chdir(rootDir)
+            stop = start_in_process(options.port)
+        try:
+            baseUrl = 'http://127.0.0.1:%d' % options.port
+            wait_until_up(baseUrl)
+            bodies = request_mix(baseUrl, options.requests, options.modal_share)
+            # one pass over a few requests first, so worker startup isn't counted
+            replay(baseUrl, bodies[:options.concurrency], options.concurrency, options.encoding)
+            results, elapsed = replay(baseUrl, bodies, options.concurrency, options.encoding)
+            report(scale, results, elapsed)
+        finally:
+            stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='load test the app callbacks on synthetic data')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1], help='synthetic data sizes, as multiples of a realistic size')
+    parser.add_argument('--server', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--requests', type=int, default=1000, help='requests to send at each scale')
+    parser.add_argument('--modal-share', type=float, default=0.1, help='share of requests that are toggle_modal clicks')
+    parser.add_argument('--encoding', default='br, gzip', help='Accept-Encoding to send (identity for uncompressed sizes)')
+    parser.add_argument('--columns', action='store_true', help='convert the data to typed columns and aggregates first')
+    parser.add_argument('--port', type=int, default=8052)
+    options = parser.parse_args()
+
+    if options.server == 'inprocess' and len(options.scales) > 1:
+        # each scale needs a fresh import of the app, so run them one at a time in their own process
+        for scale in options.scales:
+            arguments = [argument for argument in sys.argv[1:]]
+            scalesAt = arguments.index('--scales')
+            arguments[scalesAt + 1:scalesAt + 1 + len(options.scales)] = [str(scale)]
+            subprocess.run([sys.executable, os.path.abspath(__file__)] + arguments, check=True)
+    else:
+        for scale in options.scales:
+            run_scale(scale, options)
@@ -0,0 +1,61 @@
+# ----------------------------------------------------------------------------------------
+# check the rounded map points mode (MAP_ROUNDED_POINTS=1) makes each country's map smaller without moving any point
+#
+# builds every country's map figure with full precision and with rounded points, then prints the JSON bytes of each and
+# exits with an error when, for any country, the rounded map isn't at least --min-saving smaller, a rounded point lands in
+# a different 5 arc-minute grid cell or further than half its last decimal from the original, SOCD changes by more than
+# half its last decimal, or the hover text template differs
+#
+# run from the repository root with:
+#     python benchmarks/map_encoding.py
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import plotly
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+import mapdetail  # noqa: E402
+
+
+def map_figure(country, rounded):
+    app.mapRoundedPoints = rounded
+    figure = app.plain_figure(app.build_map_figure(*app.country_points(country)))
+    # the same encoder Dash uses for callback responses
+    return figure['data'][0], len(json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8'))
+
+
+def problems(full, rounded):
+    for name, axis in (('lon', 'lon'), ('lat', 'lat'), ('socd', 'marker')):
+        original = np.asarray(full[axis] if axis != 'marker' else full['marker']['color'], dtype=float)
+        sent = np.asarray(rounded[axis] if axis != 'marker' else rounded['marker']['color'], dtype=float)
+        # half the last decimal kept, plus a little for the float error of rounding
+        tolerance = 0.5 * 10.0 ** -app.pointDecimals[name] + 1e-9
+        if np.abs(sent - original).max(initial=0) > tolerance:
+            yield '%s moved by up to %g' % (name, np.abs(sent - original).max())
+        if name != 'socd' and not np.array_equal(np.floor(sent / mapdetail.baseCellDegrees), np.floor(original / mapdetail.baseCellDegrees)):
+            yield '%s moved points into other grid cells' % name
+    if full['hovertemplate'] != rounded['hovertemplate']:
+        yield 'hover text template differs'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='check rounded map points are smaller and stay in their grid cells')
+    parser.add_argument('--min-saving', type=float, default=0.3, help='smallest share of bytes the rounded map must save')
+    options = parser.parse_args()
+
+    failures = []
+    print('%-32s %8s %12s %12s %8s' % ('country', 'points', 'full bytes', 'rounded', 'saving'))
+    for country in sorted(app.soilCountryIndex):
+        (full, fullBytes), (rounded, roundedBytes) = map_figure(country, False), map_figure(country, True)
+        saving = 1 - roundedBytes / fullBytes
+        print('%-32s %8d %12d %12d %7.0f%%' % (country, len(full['lon']), fullBytes, roundedBytes, saving * 100))
+        if saving < options.min_saving:
+            failures.append('%s: rounded map saves only %.0f%%' % (country, saving * 100))
+        failures.extend('%s: %s' % (country, problem) for problem in problems(full, rounded))
+    if failures:
+        sys.exit('\n'.join(failures))
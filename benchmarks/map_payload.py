@@ -0,0 +1,75 @@
+# ----------------------------------------------------------------------------------------
+# check a country's map response grows with that country's points, not with the whole soil dataset
+#
+# for each data scale, writes synthetic datasets (see synthetic.py) and builds the map figure for the country with the
+# fewest points and the one with the most, then prints the JSON bytes of each beyond those of the empty map, per point;
+# exits with an error when any country's map takes more than --max-point-bytes a point, or the smallest country's map
+# differs from the largest's by more than --max-spread times a point (as when every country's SOCD values were sent)
+#
+# run from the repository root with e.g.:
+#     python benchmarks/map_payload.py --scales 1 4
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import plotly
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchmarksDir)
+sys.path.insert(0, benchmarksDir)
+sys.path.insert(0, rootDir)
+import synthetic  # noqa: E402
+
+
+def serialized_size(figure):
+    # the same encoder Dash uses for callback responses
+    return len(json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8'))
+
+
+def run_scale(scale, maxPointBytes, maxSpread):
+    with tempfile.TemporaryDirectory() as dataDir:
+        synthetic.write_datasets(dataDir, scale)
+        os.environ['SOIL_DATA_DIR'] = dataDir
+        # the plain map of each country's own points, as sent without the opt-in map modes
+        for flag in ('MAP_LEVEL_OF_DETAIL', 'MAP_WORLD_OVERVIEW', 'MAP_CLIENTSIDE', 'MAP_ROUNDED_POINTS'):
+            os.environ[flag] = '0'
+        os.chdir(rootDir)
+        import app
+
+        emptyBytes = serialized_size(app.cached_map_figure(None))
+        countries = sorted(app.soilCountryIndex, key=lambda country: len(app.soilCountryIndex[country][0]))
+        print('scale %gx: %d soil points, empty map %d bytes' % (scale, len(app.soilLon), emptyBytes))
+        print('  %-14s %9s %12s %14s' % ('country', 'points', 'JSON bytes', 'bytes a point'))
+        perPoint = []
+        for country in (countries[0], countries[-1]):
+            points = len(app.soilCountryIndex[country][0])
+            mapBytes = serialized_size(app.cached_map_figure(country))
+            perPoint.append((mapBytes - emptyBytes) / points)
+            print('  %-14s %9d %12d %14.1f' % (country, points, mapBytes, perPoint[-1]))
+
+        failures = ['%s takes %.1f bytes a point, over %g' % (country, bytes, maxPointBytes)
+                    for country, bytes in zip((countries[0], countries[-1]), perPoint) if bytes > maxPointBytes]
+        if max(perPoint) > maxSpread * min(perPoint):
+            failures.append('bytes a point differ %.1fx between the smallest and largest country' % (max(perPoint) / min(perPoint)))
+        if failures:
+            sys.exit('scale %gx: %s' % (scale, '; '.join(failures)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='check map responses scale with the selected country\'s points')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 4], help='synthetic data sizes, as multiples of a realistic size')
+    parser.add_argument('--max-point-bytes', type=float, default=100, help='most JSON bytes a country\'s map may take a point')
+    parser.add_argument('--max-spread', type=float, default=1.5, help='most the bytes a point may differ between countries')
+    options = parser.parse_args()
+
+    if len(options.scales) > 1:
+        # the app reads its data when first imported, so each scale runs in its own process
+        for scale in options.scales:
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--scales', str(scale),
+                            '--max-point-bytes', str(options.max_point_bytes), '--max-spread', str(options.max_spread)], check=True)
+    else:
+        run_scale(options.scales[0], options.max_point_bytes, options.max_spread)
@@ -0,0 +1,88 @@
+# ----------------------------------------------------------------------------------------
+# check and time the map selection stats from pointindex.py against a full scan of a country's points
+#
+# for a synthetic country of each size (see synthetic.py), makes random boxes, lassos and click radii over it, and compares
+# the grid bucket index's count, mean, min and max with those of a scan testing every point; prints the median time of
+# each, and exits with an error when any stats differ
+#
+# run from the repository root with e.g.:
+#     python benchmarks/selection.py --scales 1 10 --queries 200
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarksDir)
+sys.path.insert(0, os.path.dirname(benchmarksDir))
+import pointindex  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def scan_stats(socd, keep):
+    socd = socd[keep]
+    return pointindex.stats(len(socd), socd.sum(), socd.min(initial=np.inf), socd.max(initial=-np.inf))
+
+
+def same_stats(first, second):
+    return first['count'] == second['count'] and all(
+        first[key] is None and second[key] is None or np.isclose(first[key], second[key]) for key in ('mean', 'min', 'max'))
+
+
+# a random box, lasso and click inside the country's extent, and the index's and a full scan's answer to each
+def queries(rng, lon, lat, socd, index, radius):
+    west, east = np.sort(rng.uniform(lon.min(), lon.max(), 2))
+    south, north = np.sort(rng.uniform(lat.min(), lat.max(), 2))
+    yield ('box', lambda: index.box_stats(west, south, east, north),
+           lambda: scan_stats(socd, (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)))
+
+    angles = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+    distances = rng.uniform(0.3, 1, len(angles)) * (east - west + north - south) / 4
+    ring = np.column_stack([(west + east) / 2 + distances * np.cos(angles), (south + north) / 2 + distances * np.sin(angles)])
+    yield ('lasso', lambda: index.lasso_stats(ring), lambda: scan_stats(socd, pointindex.points_in_polygon(lon, lat, ring)))
+
+    clicked = rng.integers(len(lon))
+
+    def scan_radius():
+        distance = pointindex.earthRadiusKilometres * 2 * np.arcsin(np.sqrt(
+            np.sin(np.radians(lat - lat[clicked]) / 2) ** 2
+            + np.cos(np.radians(lat[clicked])) * np.cos(np.radians(lat)) * np.sin(np.radians(lon - lon[clicked]) / 2) ** 2))
+        return scan_stats(socd, distance <= radius)
+    yield ('radius', lambda: index.radius_stats(lon[clicked], lat[clicked], radius), scan_radius)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='check and time selection stats with the grid bucket index')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10], help='synthetic data sizes, as multiples of a realistic size')
+    parser.add_argument('--queries', type=int, default=200, help='random queries of each kind')
+    parser.add_argument('--radius', type=float, default=50, help='click radius in km')
+    options = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print('%-7s %-7s %9s %14s %14s' % ('scale', 'query', 'points', 'index ms', 'full scan ms'))
+    for scale in options.scales:
+        dfsoil = synthetic.synthetic_soil(scale)
+        # the largest country
+        country = dfsoil[dfsoil['Reporter_Country_name'] == dfsoil['Reporter_Country_name'].value_counts().index[0]]
+        lon, lat, socd = (country[column].to_numpy() for column in
+                          ('Reporter_Country_lon', 'Reporter_Country_lat', 'Reporter_Country_SOCD_depth4_5'))
+        index = pointindex.GridIndex(lon, lat, socd)
+        times = {}
+        for _ in range(options.queries):
+            for kind, indexed, scanned in queries(rng, lon, lat, socd, index, options.radius):
+                (indexStats, indexSeconds), (scanStats, scanSeconds) = timed(indexed), timed(scanned)
+                if not same_stats(indexStats, scanStats):
+                    sys.exit('%s stats differ: index %s, full scan %s' % (kind, indexStats, scanStats))
+                times.setdefault(kind, []).append((indexSeconds, scanSeconds))
+        for kind, seconds in times.items():
+            indexMs, scanMs = np.median(seconds, axis=0) * 1000
+            print('%-7g %-7s %9d %14.3f %14.3f' % (scale, kind, len(lon), indexMs, scanMs))
@@ -0,0 +1,97 @@
+# ----------------------------------------------------------------------------------------
+# check soilpoints.py's country mask and tiled grid reading on a synthetic SOCD grid and borders, and time them
+#
+# writes a synthetic global grid and country borders (see synthetic.py), then compares the country mask with a plain
+# point in polygon test of every cell center in each country's bounding box, and the soil points read with one process
+# with those read by a pool of processes; prints the time of each step, and exits with an error when anything differs
+#
+# run from the repository root with e.g.:
+#     python benchmarks/soil_points.py --countries 40 --processes 4
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarksDir)
+sys.path.insert(0, os.path.dirname(benchmarksDir))
+import synthetic  # noqa: E402
+
+
+# whether each point is inside the rings by the even-odd rule, testing the points against one edge at a time
+def points_inside(rings, lon, lat):
+    inside = np.zeros(len(lon), dtype=bool)
+    for ring in rings:
+        for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+            crosses = (y1 <= lat) != (y2 <= lat)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inside ^= crosses & (lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+
+def reference_mask(soilpoints, countries, shape):
+    mask = np.full(shape, -1, dtype=np.int16)
+    lons = soilpoints.gridWest + (np.arange(shape[1]) + 0.5) * soilpoints.cellDegrees
+    lats = soilpoints.gridNorth - (np.arange(shape[0]) + 0.5) * soilpoints.cellDegrees
+    for number, country in enumerate(countries):
+        points = np.concatenate(country['rings'])
+        cols = np.nonzero((points[:, 0].min() <= lons) & (lons <= points[:, 0].max()))[0]
+        rows = np.nonzero((points[:, 1].min() <= lats) & (lats <= points[:, 1].max()))[0]
+        row, col = (grid.ravel() for grid in np.meshgrid(rows, cols, indexing='ij'))
+        inside = points_inside(country['rings'], lons[col], lats[row])
+        free = mask[row, col] == -1
+        mask[row[inside & free], col[inside & free]] = number
+    return mask
+
+
+def timed(name, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    print('%-36s %7.2fs' % (name, time.perf_counter() - start))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='check and time making soil points from a SOCD grid')
+    parser.add_argument('--countries', type=int, default=40, help='synthetic countries to draw')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='processes for the pooled run')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dataDir:
+        # soilpoints caches its country masks where its data is, which it reads when first imported
+        os.environ['SOIL_DATA_DIR'] = dataDir
+        import soilpoints
+        gridPath = os.path.join(dataDir, 'SOCD5min.npy')
+        countriesPath = os.path.join(dataDir, 'countries.geojson')
+        synthetic.write_socd_grid(gridPath)
+        synthetic.write_countries(countriesPath, options.countries)
+        countries = soilpoints.read_countries(countriesPath)
+        shape = np.load(gridPath, mmap_mode='r').shape
+
+        mask = timed('country mask, crossings by row', soilpoints.country_mask, countries, shape)
+        expected = timed('country mask, point in polygon tests', reference_mask, soilpoints, countries, shape)
+        if not np.array_equal(mask, expected):
+            sys.exit('country mask differs from the point in polygon test in %d cells' % np.count_nonzero(mask != expected))
+
+        names = [country['name'] for country in countries[::2]]
+        timed('cache the country mask', soilpoints.cached_country_mask, countriesPath, countries, shape)
+        single = timed('soil points, 1 process', soilpoints.grid_points, gridPath, countriesPath, names, processes=1)
+        pooled = timed('soil points, %d processes' % options.processes, soilpoints.grid_points, gridPath, countriesPath, names,
+                       processes=options.processes)
+        pd.testing.assert_frame_equal(single, pooled)
+        # every cell with a value in a chosen country by the point in polygon test is a point, with its own value and country
+        grid = np.load(gridPath)
+        chosen = np.isin(expected, [number for number, country in enumerate(countries) if country['name'] in names]) & ~np.isnan(grid)
+        rows = np.round((soilpoints.gridNorth - single['Reporter_Country_lat']) / soilpoints.cellDegrees - 0.5).astype(int)
+        cols = np.round((single['Reporter_Country_lon'] - soilpoints.gridWest) / soilpoints.cellDegrees - 0.5).astype(int)
+        countryNames = np.array([country['name'] for country in countries])
+        if len(single) != np.count_nonzero(chosen) or not chosen[rows, cols].all() \
+                or not (countryNames[expected[rows, cols]] == single['Reporter_Country_name']).all() \
+                or not np.array_equal(grid[rows, cols], single[soilpoints.socdColumn]):
+            sys.exit('soil points differ from the cells of the chosen countries')
+        print('%d soil points in %d countries match the point in polygon test' % (len(single), single['Reporter_Country_name'].nunique()))
@@ -0,0 +1,153 @@
+# ----------------------------------------------------------------------------------------
+# synthetic stand-ins for the app's datasets, with the same columns, at any multiple of a realistic size
+#
+# at scale 1 there are 40 reporter countries of 200 to 20,000 soil points each (about 150,000 in all) on a 5 arc-minute grid,
+# and 30,000 food trade rows between 200 partner countries and 250 items; scale multiplies the points and trade rows
+# (above scale 1 the countries keep their size on the map and their points are spread on a finer grid)
+# write_faostat also makes a file shaped like FAOSTAT's normalized Detailed Trade Matrix download, for tradestore.py,
+# and write_socd_grid and write_countries a global SOCD grid and country borders to make soil points from, for soilpoints.py
+#
+# run from the repository root with:
+#     python benchmarks/synthetic.py <output folder> [scale]
+# then point the app at it with SOIL_DATA_DIR=<output folder>
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+continents = ['Africa', 'Oceania', 'South America', 'Asia', 'North America', 'Europe']
+cellDegrees = 5 / 60
+
+
+def synthetic_soil(scale=1, countries=40, seed=0):
+    rng = np.random.default_rng(seed)
+    cell = cellDegrees / np.ceil(np.sqrt(max(scale, 1)))
+    frames = []
+    for number in range(countries):
+        points = int(10 ** rng.uniform(np.log10(200), np.log10(20000)) * scale)
+        # each country is a block of grid cells somewhere on land-ish latitudes, with points in about half its cells' centers
+        width = int(np.ceil(np.sqrt(points * 2)))
+        cells = rng.choice(width * width, size=points, replace=False)
+        west = np.floor(rng.uniform(-170, 170 - width * cell) / cellDegrees) * cellDegrees
+        south = np.floor(rng.uniform(-50, 70 - width * cell) / cellDegrees) * cellDegrees
+        frames.append(pd.DataFrame({
+            'Reporter_Country_name': 'Country %02d' % number,
+            'Reporter_Country_continent': continents[number % len(continents)],
+            'Reporter_Country_iso_a3': 'C%02d' % number,
+            'Reporter_Country_pop_est': float(int(10 ** rng.uniform(5, 9.2))),
+            'Reporter_Country_lon': west + (cells % width + 0.5) * cell,
+            'Reporter_Country_lat': south + (cells // width + 0.5) * cell,
+            'Reporter_Country_SOCD_depth4_5': rng.gamma(2.0, 20.0, len(cells)),
+        }))
+    # shuffled, like the CSV exported from the notebook isn't grouped by country
+    return pd.concat(frames).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def synthetic_food(scale=1, partners=200, items=250, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = int(30000 * scale)
+    return pd.DataFrame({
+        'Reporter_Country_name_x': rng.choice(['China', 'United States of America'], rows),
+        'Partner_Country_name': rng.choice(['Partner %03d' % number for number in range(partners)], rows),
+        'Item': rng.choice(['Item %03d' % number for number in range(items)], rows),
+        'Export_Quantity_2019_Value_tonnes': rng.gamma(0.5, 20000.0, rows).round(),
+    })
+
+
+# the normalized bulk download's columns, one row per reporter, partner, item, element and year; the soil data's reporters
+# ('Country 00', ...) are among many others, and export quantities among other elements, as in the real file
+# (including export quantities of live animals, which are counted in head rather than tonnes)
+faostatColumns = ['Reporter Country Code', 'Reporter Countries', 'Partner Country Code', 'Partner Countries', 'Item Code', 'Item',
+                  'Element Code', 'Element', 'Year Code', 'Year', 'Unit', 'Value', 'Flag']
+faostatElements = [(5910, 'Export Quantity', 'tonnes'), (5908, 'Export Quantity', 'Head'), (5922, 'Export Value', '1000 US$'),
+                   (5610, 'Import Quantity', 'tonnes')]
+
+
+def write_faostat(path, years, rowsPerYear=1000000, reporters=80, partners=200, items=250, seed=0):
+    rng = np.random.default_rng(seed)
+    reporterNames = np.array(['Country %02d' % number for number in range(reporters)])
+    partnerNames = np.array(['Partner %03d' % number for number in range(partners)])
+    itemNames = np.array(['Item %03d' % number for number in range(items)])
+    elementCodes, elementNames, units = (np.array(values) for values in zip(*faostatElements))
+    header = True
+    # written a block of rows at a time, so files larger than memory can be made
+    for year in years:
+        for start in range(0, rowsPerYear, 250000):
+            rows = min(250000, rowsPerYear - start)
+            reporter = rng.integers(reporters, size=rows)
+            partner = rng.integers(partners, size=rows)
+            item = rng.integers(items, size=rows)
+            element = rng.integers(len(faostatElements), size=rows)
+            pd.DataFrame({
+                'Reporter Country Code': reporter + 1,
+                'Reporter Countries': reporterNames[reporter],
+                'Partner Country Code': partner + 1,
+                'Partner Countries': partnerNames[partner],
+                'Item Code': item + 1,
+                'Item': itemNames[item],
+                'Element Code': elementCodes[element],
+                'Element': elementNames[element],
+                'Year Code': year,
+                'Year': year,
+                'Unit': units[element],
+                'Value': rng.gamma(0.5, 2000.0, rows).round(),
+                'Flag': 'A',
+            }, columns=faostatColumns).to_csv(path, mode='w' if header else 'a', header=header, index=False, encoding='latin-1')
+            header = False
+
+
+# a global 5 arc-minute grid of SOCD values with NaN for the cells without data (about a third of them, in bands like oceans)
+def write_socd_grid(path, rows=2160, cols=4320, seed=0):
+    rng = np.random.default_rng(seed)
+    grid = rng.gamma(2.0, 20.0, (rows, cols)).astype(np.float32)
+    grid[:, np.sin(np.arange(cols) / cols * 14) > 0.5] = np.nan
+    grid[rng.random((rows, cols)) < 0.02] = np.nan
+    np.save(path, grid)
+
+
+# a ring of points around a center, at random distances, so its shape has both convex and concave parts
+def random_ring(rng, lon, lat, radius, vertices):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    distances = radius * rng.uniform(0.4, 1.0, vertices)
+    ring = np.column_stack([lon + distances * np.cos(angles), lat + distances * np.sin(angles)])
+    return np.vstack([ring, ring[:1]]).round(4).tolist()
+
+
+# GeoJSON borders of countries named 'Country 00', ... with naturalearth_lowres' properties; every third country has a
+# hole in it (like South Africa around Lesotho) and every fourth has a second, separate part
+def write_countries(path, countries=40, seed=0):
+    rng = np.random.default_rng(seed)
+    features = []
+    for number in range(countries):
+        lon, lat, radius = rng.uniform(-160, 160), rng.uniform(-50, 65), rng.uniform(2, 12)
+        polygon = [random_ring(rng, lon, lat, radius, int(rng.integers(8, 200)))]
+        if number % 3 == 0:
+            # a small hole in the middle, drawn the other way around
+            polygon.append(random_ring(rng, lon, lat, radius * 0.3, 12)[::-1])
+        polygons = [polygon]
+        if number % 4 == 0:
+            polygons.append([random_ring(rng, lon + radius * 1.5, lat, radius * 0.3, 20)])
+        features.append({
+            'type': 'Feature',
+            'properties': {'name': 'Country %02d' % number, 'continent': continents[number % len(continents)],
+                           'iso_a3': 'C%02d' % number, 'pop_est': int(10 ** rng.uniform(5, 9.2))},
+            'geometry': {'type': 'MultiPolygon', 'coordinates': polygons} if len(polygons) > 1 else {'type': 'Polygon', 'coordinates': polygon},
+        })
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def write_datasets(folder, scale=1):
+    os.makedirs(folder, exist_ok=True)
+    synthetic_soil(scale).to_csv(os.path.join(folder, 'dfsoil_subUSCN_prod.csv'), index=False)
+    synthetic_food(scale).to_csv(os.path.join(folder, 'dffood.csv'), index=False)
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1]
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    write_datasets(folder, scale)
+    print('wrote scale %g synthetic datasets to %s' % (scale, folder))
@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------------------------
+# check tradestore.py's streamed ingestion on a synthetic FAOSTAT-shaped file, and time it
+#
+# writes synthetic soil data and a normalized trade matrix file for a few years (see synthetic.py), ingests it, and compares
+# each year's store with the same sums computed by reading the whole file at once; then writes the file again with one more
+# year and ingests it again, checking only the new year is added; prints the time and peak traced memory of each ingestion,
+# and exits with an error when anything differs (including live animal head counts being summed as tonnes) or any of the
+# soil data's countries matches no reporter
+#
+# run from the repository root with e.g.:
+#     python benchmarks/trade_ingest.py --years 2017 2018 2019 --rows 1000000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarksDir)
+sys.path.insert(0, os.path.dirname(benchmarksDir))
+import synthetic  # noqa: E402
+
+
+def timed_ingest(tradestore, sourcePath):
+    tracemalloc.start()
+    start = time.perf_counter()
+    added, unmatched = tradestore.ingest(sourcePath)
+    seconds = time.perf_counter() - start
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('ingested %.0f MB in %.1fs, peak traced memory %.0f MB, added years: %s'
+          % (os.path.getsize(sourcePath) / 1e6, seconds, peakBytes / 1e6, ', '.join(map(str, added)) or 'none'))
+    if unmatched:
+        sys.exit('no reporter rows matched %s' % ', '.join(unmatched))
+    return added
+
+
+# the same sums as the stores should hold, from the whole file read at once
+def expected_exports(tradestore, sourcePath, reporters):
+    df = pd.read_csv(sourcePath, encoding='latin-1')
+    df = df[(df['Element'] == 'Export Quantity') & (df['Unit'] == 'tonnes') & df['Reporter Countries'].isin(reporters)]
+    df = df.drop(columns='Unit').rename(columns=tradestore.sourceColumns).rename(columns={'Value': tradestore.quantityColumn})
+    return df.groupby(['Year'] + tradestore.keyColumns)[tradestore.quantityColumn].sum().reset_index()
+
+
+def check_year(tradestore, expected, year):
+    stored = tradestore.load_year(year).astype({column: str for column in tradestore.keyColumns})
+    wanted = expected[expected['Year'] == year].drop(columns='Year').reset_index(drop=True)
+    if len(stored) != len(wanted) or not (stored[tradestore.keyColumns] == wanted[tradestore.keyColumns]).all().all() \
+            or not np.allclose(stored[tradestore.quantityColumn], wanted[tradestore.quantityColumn]):
+        sys.exit('year %d store differs from the sums of the whole file' % year)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='check and time the streamed FAOSTAT trade ingestion')
+    parser.add_argument('--years', type=int, nargs='+', default=[2017, 2018, 2019], help='years in the first file; the second adds one more')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows per year in the synthetic file')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dataDir:
+        # tradestore reads where its data is when first imported
+        os.environ['SOIL_DATA_DIR'] = dataDir
+        import tradestore
+        synthetic.write_datasets(dataDir)
+        reporters = tradestore.soil_reporters()
+        sourcePath = os.path.join(dataDir, 'Trade_DetailedTradeMatrix_E_All_Data_(Normalized).csv')
+
+        synthetic.write_faostat(sourcePath, options.years, options.rows)
+        added = timed_ingest(tradestore, sourcePath)
+        if added != sorted(options.years):
+            sys.exit('expected years %s to be added' % options.years)
+        expected = expected_exports(tradestore, sourcePath, reporters)
+        for year in added:
+            check_year(tradestore, expected, year)
+
+        newYear = max(options.years) + 1
+        synthetic.write_faostat(sourcePath, options.years + [newYear], options.rows)
+        added = timed_ingest(tradestore, sourcePath)
+        if added != [newYear]:
+            sys.exit('expected only %d to be added on the rerun, got %s' % (newYear, added))
+        check_year(tradestore, expected_exports(tradestore, sourcePath, reporters), newYear)
+        print('stores match the whole file sums for years %s' % ', '.join(map(str, tradestore.years())))
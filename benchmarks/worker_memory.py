@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------------------
+# measure per-worker memory of the app under gunicorn --preload, at 1, 4 and 8 workers by default
+#
+# RSS counts every page a worker maps, including ones shared with other workers; PSS splits each shared
+# page evenly between the processes sharing it, so the total PSS is the memory the app really uses
+# (linux only, as it reads /proc/<pid>/smaps_rollup)
+#
+# run from the repository root with:
+#     python benchmarks/worker_memory.py [workers ...]
+
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+port = int(os.environ.get('BENCHMARK_PORT', 8051))
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_kb(pid):
+    sizes = {}
+    with open('/proc/%d/smaps_rollup' % pid) as f:
+        for line in f:
+            field, _, value = line.partition(':')
+            if field in ('Rss', 'Pss'):
+                sizes[field] = int(value.split()[0])
+    return sizes
+
+
+def child_pids(pid):
+    with open('/proc/%d/task/%d/children' % (pid, pid)) as f:
+        return [int(child) for child in f.read().split()]
+
+
+def post_country(country):
+    body = {'output': 'map-socd-graph.figure', 'outputs': {'id': 'map-socd-graph', 'property': 'figure'},
+            'inputs': [{'id': 'reporter_country_dropdown', 'property': 'value', 'value': country}],
+            'changedPropIds': ['reporter_country_dropdown.value'], 'state': []}
+    request = urllib.request.Request('http://127.0.0.1:%d/_dash-update-component' % port, data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    urllib.request.urlopen(request).read()
+
+
+def app_countries():
+    layout = json.loads(urllib.request.urlopen('http://127.0.0.1:%d/_dash-layout' % port).read())
+    found = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('props', {}).get('id') == 'reporter_country_dropdown':
+                found.extend(node['props']['options'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+    walk(layout)
+    return found[:10]
+
+
+def measure(workers):
+    command = [sys.executable, '-m', 'gunicorn', 'app:server', '--preload', '--workers', str(workers),
+               '--bind', '127.0.0.1:%d' % port]
+    master = subprocess.Popen(command, cwd=rootDir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(600):
+            try:
+                urllib.request.urlopen('http://127.0.0.1:%d/' % port).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        # spread some map requests over the workers so each one touches the soil data
+        countries = [option['value'] for option in app_countries()]
+        for country in countries * workers:
+            post_country(country)
+        pids = child_pids(master.pid)
+        sizes = [memory_kb(pid) for pid in pids]
+        return memory_kb(master.pid), sizes
+    finally:
+        master.terminate()
+        master.wait()
+
+
+if __name__ == '__main__':
+    workerCounts = [int(count) for count in sys.argv[1:]] or [1, 4, 8]
+    print('%8s %14s %14s %14s %16s' % ('workers', 'master PSS MB', 'worker RSS MB', 'worker PSS MB', 'total PSS MB'))
+    for workers in workerCounts:
+        master, sizes = measure(workers)
+        workerRss = sum(size['Rss'] for size in sizes) / len(sizes) / 1024
+        workerPss = sum(size['Pss'] for size in sizes) / len(sizes) / 1024
+        totalPss = (master['Pss'] + sum(size['Pss'] for size in sizes)) / 1024
+        print('%8d %14.1f %14.1f %14.1f %16.1f' % (workers, master['Pss'] / 1024, workerRss, workerPss, totalPss))
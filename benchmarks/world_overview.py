@@ -0,0 +1,76 @@
+# ----------------------------------------------------------------------------------------
+# compare the world overview map (MAP_WORLD_OVERVIEW=1) with drawing every country's raw points at once
+#
+# for each data scale, writes synthetic datasets (see synthetic.py) and builds both figures with the app's own functions,
+# then prints what reaches the browser for each: markers or bins to draw, JSON bytes as sent and after gzip and brotli,
+# and the server time to build and serialize it (first and repeated, for the cached world overview); a zoomed in view is
+# included, as sent in level of detail mode
+#
+# the browser's drawing time isn't measured here, since there is no browser; it grows with the points drawn, which are listed
+#
+# run from the repository root with e.g.:
+#     python benchmarks/world_overview.py --scales 1 10
+
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import brotli
+import plotly
+
+benchmarksDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchmarksDir)
+sys.path.insert(0, benchmarksDir)
+sys.path.insert(0, rootDir)
+import synthetic  # noqa: E402
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    figure = function(*args)
+    # the same encoder Dash uses for callback responses
+    body = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+    return figure, body, time.perf_counter() - start
+
+
+def report(name, figure, body, seconds):
+    trace = figure['data'][0]
+    print('  %-30s %10d %12d %10d %10d %10.1f' % (name, len(trace.get('lon', [])), len(body), len(gzip.compress(body)),
+                                                   len(brotli.compress(body, quality=4)), seconds * 1000))
+
+
+def run_scale(scale):
+    with tempfile.TemporaryDirectory() as dataDir:
+        synthetic.write_datasets(dataDir, scale)
+        os.environ['SOIL_DATA_DIR'] = dataDir
+        os.environ['MAP_WORLD_OVERVIEW'] = '1'
+        os.chdir(rootDir)
+        import app
+
+        print('scale %gx: %d soil points' % (scale, len(app.soilLon)))
+        print('  %-30s %10s %12s %10s %10s %10s' % ('map', 'drawn', 'JSON bytes', 'gzip', 'brotli', 'ms'))
+        report('raw points, every country', *timed(lambda: app.plain_figure(app.build_map_figure(app.soilLon, app.soilLat, app.soilSOCD))))
+        report('world overview, first', *timed(app.cached_map_figure, None))
+        report('world overview, cached', *timed(app.cached_map_figure, None))
+        # a 20 by 10 degree view around the middle of the first country, as level of detail mode sends after zooming in
+        lon, lat, _ = next(iter(app.soilCountryIndex.values()))
+        bounds = [lon.mean() - 10, lat.mean() - 5, lon.mean() + 10, lat.mean() + 5]
+        report('world overview, zoomed in', *timed(app.world_figure_for_view, bounds))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compare the world overview map with raw points')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10], help='synthetic data sizes, as multiples of a realistic size')
+    options = parser.parse_args()
+
+    if len(options.scales) > 1:
+        # the app reads its data when first imported, so each scale runs in its own process
+        for scale in options.scales:
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--scales', str(scale)], check=True)
+    else:
+        run_scale(options.scales[0])
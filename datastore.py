@@ -0,0 +1,151 @@
+# ----------------------------------------------------------------------------------------
+# read and write the app's datasets as typed columns, so app startup skips parsing CSV text
+#
+# each CSV gets a sibling directory (e.g. ./data/dffood.columns/) holding one .npy file per column
+# and a meta.json describing them; text columns (country names, continents, items) are stored as
+# integer category codes with their labels listed once in meta.json
+#
+# convert the CSVs offline (again whenever the CSVs change) by running:
+#     python datastore.py
+# the app falls back to reading the CSV when a column directory is missing, or was converted from a CSV of another size or
+# modification time than the one there now (with a warning to convert it again)
+
+import functools
+import hashlib
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# the folder holding the app's data files; can be pointed elsewhere e.g. for synthetic benchmark data
+dataDir = os.environ.get('SOIL_DATA_DIR', './data')
+
+# the app's datasets, by CSV file name, with the column to sort rows by before storing (if any)
+# soil points are stored grouped by country so each country's points are one contiguous block
+datasets = {
+    'dffood.csv': None,
+    'dfsoil_subUSCN_prod.csv': 'Reporter_Country_name',
+}
+
+
+def column_store_path(csvPath):
+    return os.path.splitext(csvPath)[0] + '.columns'
+
+
+# fingerprint of the CSV contents, recorded with the converted columns (and used to version derived files)
+def file_version(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+# the CSV's size and modification time, recorded with its converted columns to notice cheaply, at every startup, that the
+# CSV is the one they were converted from; a copy or fresh checkout has a new time, so then its contents are compared instead
+def file_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtimeNs': stat.st_mtime_ns}
+
+
+# whether the CSV's contents are those of the given version, checked once per process for each size and time of the file
+@functools.lru_cache(maxsize=None)
+def has_version(path, size, mtimeNs, version):
+    return file_version(path) == version
+
+
+def write_column_store(df, storePath, version, source=None):
+    os.makedirs(storePath, exist_ok=True)
+    columns = []
+    for number, name in enumerate(df.columns):
+        values = df[name]
+        fileName = '%03d.npy' % number
+        column = {'name': name, 'file': fileName, 'categories': None}
+        if values.dtype == object or isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            # store text as the smallest integer codes that fit, with missing values as -1
+            categorical = pd.Categorical(values)
+            column['categories'] = [str(category) for category in categorical.categories]
+            codeType = np.int16 if len(categorical.categories) < np.iinfo(np.int16).max else np.int32
+            array = categorical.codes.astype(codeType)
+        else:
+            array = values.to_numpy()
+        np.save(os.path.join(storePath, fileName), np.ascontiguousarray(array), allow_pickle=False)
+        columns.append(column)
+    # write meta.json last, so a half-written directory is never picked up by the loader
+    with open(os.path.join(storePath, 'meta.json'), 'w') as f:
+        json.dump({'version': version, 'source': source, 'rows': len(df), 'columns': columns}, f)
+
+
+def read_column_store_meta(storePath):
+    with open(os.path.join(storePath, 'meta.json')) as f:
+        return json.load(f)
+
+
+# with mmapMode='r' the numeric columns stay memory-mapped read-only from the .npy files instead of being
+# read into each process's own memory, so every gunicorn worker shares one physical copy through the page cache
+# (and, holding no python objects per row, the pages are never copied on write by reference counting after a fork)
+def read_column_store(storePath, mmapMode=None):
+    meta = read_column_store_meta(storePath)
+    frame = {}
+    for column in meta['columns']:
+        array = np.load(os.path.join(storePath, column['file']), mmap_mode=mmapMode, allow_pickle=False)
+        if column['categories'] is not None:
+            # text stays as integer codes; only the short list of distinct labels are python strings
+            array = pd.Categorical.from_codes(array, categories=column['categories'])
+        frame[column['name']] = array
+    # copy=False keeps each column backed by its (memory-mapped) array rather than copying into combined blocks
+    return pd.DataFrame(frame, copy=False)
+
+
+def sort_rows(df, csvName):
+    sortBy = datasets[csvName]
+    if sortBy is not None:
+        # a stable sort keeps rows within each group in their original CSV order
+        df = df.sort_values(by=sortBy, kind='mergesort').reset_index(drop=True)
+    return df
+
+
+# a CSV's converted columns, or None when there are none or they were converted from a different CSV than the one there now
+# (e.g. it was regenerated without running this script again); with no CSV there at all, the columns are used as they are
+def current_column_store(csvPath):
+    storePath = column_store_path(csvPath)
+    if not os.path.exists(os.path.join(storePath, 'meta.json')):
+        return None
+    if not os.path.exists(csvPath):
+        return storePath
+    meta = read_column_store_meta(storePath)
+    stamp = file_stamp(csvPath)
+    source = meta.get('source') or {}
+    if source == stamp:
+        return storePath
+    # a new time with the same size (or none recorded), as after a checkout or copy: compare the contents
+    if source.get('size', stamp['size']) == stamp['size'] and has_version(csvPath, stamp['size'], stamp['mtimeNs'], meta['version']):
+        return storePath
+    warnings.warn('%s has changed since it was converted, so it is read from the CSV; run `python datastore.py` to convert it again' % csvPath)
+    return None
+
+
+# read a dataset from its converted columns if they are current (memory-mapped by default), otherwise from the CSV itself;
+# either way rows come back in the same order, e.g. soil points grouped by country
+def load_frame(csvName, mmapMode='r'):
+    csvPath = os.path.join(dataDir, csvName)
+    storePath = current_column_store(csvPath)
+    if storePath is not None:
+        return read_column_store(storePath, mmapMode=mmapMode)
+    return sort_rows(pd.read_csv(csvPath), csvName)
+
+
+def convert_csv(csvName):
+    csvPath = os.path.join(dataDir, csvName)
+    df = sort_rows(pd.read_csv(csvPath), csvName)
+    write_column_store(df, column_store_path(csvPath), file_version(csvPath), source=file_stamp(csvPath))
+    return df
+
+
+if __name__ == '__main__':
+    for csvName in sys.argv[1:] or datasets:
+        df = convert_csv(csvName)
+        print('converted %s: %d rows, %d columns' % (csvName, len(df), len(df.columns)))
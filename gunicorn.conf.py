@@ -0,0 +1,25 @@
+# ----------------------------------------------------------------------------------------
+# gunicorn settings hooks, read automatically by `gunicorn app:server` from the app's folder
+# (the command line options in the Procfile still apply on top of these)
+
+import gc
+
+
+# with --preload the app and its data are loaded once in the master process before workers are forked;
+# freezing the garbage collector here moves every object loaded so far out of its tracking, so the
+# collector in each worker never writes to (and so never copies) the pages holding them
+def when_ready(server):
+    gc.freeze()
+
+
+# start prebuilding the app's figures in the background once each worker has loaded the app (after forking, so the thread
+# runs in the worker; see warmup.py), without delaying the worker taking requests
+def post_worker_init(worker):
+    import warmup
+    warmup.start()
+
+
+# add how often this worker's visitors chose each country to the counts the next workers warm up by
+def worker_exit(server, worker):
+    import warmup
+    warmup.save_popularity()
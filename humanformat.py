@@ -0,0 +1,77 @@
+# ----------------------------------------------------------------------------------------
+# make numbers into a more human readable format for a whole column at once, e.g., 12345591313 to '12.3 billion'
+#
+# gives exactly what humanize.intword gives for each value, but works out the thousand/million/billion... suffix
+# and the scaled number for every value with numpy at once, rather than calling humanize once per row
+
+import re
+
+import humanize
+import numpy as np
+import pandas as pd
+
+# the suffixes humanize.intword uses, for values of at least 10**3, 10**6, 10**9, ...
+suffixes = np.array(['thousand', 'million', 'billion', 'trillion', 'quadrillion', 'quintillion', 'sextillion',
+                     'septillion', 'octillion', 'nonillion', 'decillion'])
+powers = 10.0 ** np.arange(3, 3 * len(suffixes) + 3, 3)
+# beyond the range of 64 bit integers, leave the (rare) values to humanize itself
+vectorizedLimit = 10 ** 18
+
+
+# format non-negative numbers with a printf style format like '%.1f', as `format % number` would
+def format_numbers(format, numbers):
+    match = re.fullmatch(r'%0?\.(\d)f', format)
+    if match is None:
+        return np.char.mod(format, numbers)
+    # for a plain fixed number of decimals, round to whole numbers of the last decimal place and put the digits
+    # together as text, which is much faster than formatting each number
+    decimals = int(match.group(1))
+    scaled = numbers * 10 ** decimals
+    rounded = np.rint(scaled).astype(np.int64)
+    wholePart = (rounded // 10 ** decimals).astype(str)
+    if decimals:
+        number = np.char.add(np.char.add(wholePart, '.'), np.char.zfill((rounded % 10 ** decimals).astype(str), decimals))
+    else:
+        number = wholePart
+    # printf rounds the exact binary value, which can differ from rounding the scaled value when it is within a hair of
+    # halfway between two last digits; format those few the slow way
+    nearHalf = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if nearHalf.any():
+        number[nearHalf] = np.char.mod(format, numbers[nearHalf])
+    return number
+
+
+def intword(values, format='%.1f'):
+    series = values if isinstance(values, pd.Series) else None
+    values = np.asarray(values)
+    words = np.empty(len(values), dtype=object)
+    numeric = values.astype(float)
+    # like humanize, leave values that aren't numbers (NaN) as they are; infinite values too, where humanize raises an error
+    finite = np.isfinite(numeric)
+    words[~finite] = values[~finite]
+    # humanize works on the value truncated to an integer
+    if np.issubdtype(values.dtype, np.integer):
+        whole = values.astype(np.int64)
+    else:
+        # (clipped into 64 bit integer range; values that far out are handed to humanize below anyway)
+        whole = np.trunc(np.clip(np.where(finite, numeric, 0), -vectorizedLimit, vectorizedLimit)).astype(np.int64)
+    small = finite & (whole < 1000)
+    words[small] = whole[small].astype(str)
+    big = finite & (np.abs(numeric) >= vectorizedLimit)
+    words[big] = [humanize.intword(value, format) for value in values[big]]
+
+    large = finite & ~small & ~big
+    whole = whole[large]
+    # which power of a thousand each value is at least (0 for thousands, 1 for millions, ...)
+    ordinal = np.searchsorted(powers, whole, side='right') - 1
+    number = format_numbers(format, whole / powers[ordinal])
+    # a value that rounds up to 1000 of one suffix (e.g. 999,999 as '1000.0 thousand') is shown as 1 of the next one
+    roundsUp = number == format % 1000.0
+    if roundsUp.any():
+        ordinal[roundsUp] += 1
+        number[roundsUp] = format_numbers(format, whole[roundsUp] / powers[ordinal[roundsUp]])
+    words[large] = np.char.add(np.char.add(number, ' '), suffixes[ordinal])
+
+    if series is not None:
+        return pd.Series(words, index=series.index, name=series.name)
+    return words
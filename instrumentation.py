@@ -0,0 +1,197 @@
+# ----------------------------------------------------------------------------------------
+# opt-in timing of the app's startup stages, callbacks and responses (set SOIL_METRICS=1)
+#
+# timings and response sizes are kept as histograms and served in Prometheus' text format at /metrics;
+# with SOIL_PROFILE_DIR and SOIL_PROFILE_TOKEN also set, a request sent with the header `X-Profile: <the token>` is profiled
+# and the result saved there, its file name returned in the X-Profile-File header (with pyinstrument's sampling profiler
+# when it is installed, otherwise with cProfile); without the token no request is profiled, so visitors can't fill the disk
+# when not enabled, the stage timers do nothing and no hooks or routes are added
+
+import bisect
+import contextlib
+import cProfile
+import hmac
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+enabled = os.environ.get('SOIL_METRICS', '0') == '1'
+profileDir = os.environ.get('SOIL_PROFILE_DIR')
+profileToken = os.environ.get('SOIL_PROFILE_TOKEN')
+
+secondsBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+bytesBuckets = tuple(10 ** power for power in range(2, 9))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def lines(self, name, labels):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], counts):
+            cumulative += count
+            lines.append('%s_bucket{%sle="%s"} %d' % (name, labels, bound, cumulative))
+        labels = labels.rstrip(',')
+        lines.append('%s_sum{%s} %r' % (name, labels, total))
+        lines.append('%s_count{%s} %d' % (name, labels, cumulative))
+        return lines
+
+
+# each metric's help text, buckets and histograms by label value
+metrics = {
+    'soil_stage_seconds': ('Time spent in each startup or map building stage.', secondsBuckets, 'stage', {}),
+    'soil_callback_seconds': ('Time spent running each Dash callback, including encoding its output.', secondsBuckets, 'callback', {}),
+    'soil_request_seconds': ('Time spent on each request, by path (and callback output for Dash updates).', secondsBuckets, 'route', {}),
+    'soil_response_bytes': ('Size of each response body as sent, by path (and callback output for Dash updates).', bytesBuckets, 'route', {}),
+}
+# single values read when /metrics is served, by name: (help text, function returning the value)
+gauges = {}
+
+
+def observe(metric, label, value):
+    _, buckets, _, histograms = metrics[metric]
+    histogram = histograms.get(label)
+    if histogram is None:
+        histogram = histograms.setdefault(label, Histogram(buckets))
+    histogram.observe(value)
+
+
+@contextlib.contextmanager
+def timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('soil_stage_seconds', name, time.perf_counter() - start)
+
+
+# time a block of code as a named stage, e.g. `with instrumentation.stage('load_soil'):`
+def stage(name):
+    return timed_stage(name) if enabled else contextlib.nullcontext()
+
+
+def metrics_text():
+    lines = []
+    for name, (helpText, _, labelName, histograms) in metrics.items():
+        lines.append('# HELP %s %s' % (name, helpText))
+        lines.append('# TYPE %s histogram' % name)
+        for label, histogram in sorted(histograms.items()):
+            lines.extend(histogram.lines(name, '%s="%s",' % (labelName, label.replace('"', '\\"'))))
+    for name, (helpText, read) in gauges.items():
+        lines.append('# HELP %s %s' % (name, helpText))
+        lines.append('# TYPE %s gauge' % name)
+        lines.append('%s %r' % (name, read()))
+    return '\n'.join(lines) + '\n'
+
+
+# the route's rule rather than the path asked for, and for callbacks only outputs the app has a callback for,
+# so made up paths and outputs can't add endless labels
+def route_label(callbackMap):
+    rule = request.url_rule.rule if request.url_rule is not None else '(no route)'
+    if rule.endswith('_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        output = body.get('output') if isinstance(body, dict) else None
+        if isinstance(output, str) and output in callbackMap:
+            return '%s %s' % (rule, output)
+    return rule
+
+
+def timed_callback(name, callback):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            observe('soil_callback_seconds', name, time.perf_counter() - start)
+    return timed
+
+
+def start_profile():
+    if pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def save_profile(profiler):
+    os.makedirs(profileDir, exist_ok=True)
+    fileName = '%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), request.path.strip('/').replace('/', '_') or 'index')
+    if pyinstrument is not None:
+        profiler.stop()
+        path = os.path.join(profileDir, fileName + '.html')
+        with open(path, 'w') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = os.path.join(profileDir, fileName + '.prof')
+        profiler.dump_stats(path)
+    # only the name, so the server's folders aren't shown to the client
+    return os.path.basename(path)
+
+
+def profile_requested():
+    if not (profileDir and profileToken):
+        return False
+    return hmac.compare_digest(request.headers.get('X-Profile', '').encode('utf-8'), profileToken.encode('utf-8'))
+
+
+# add the timing hooks and the /metrics route to a Dash app, once all its callbacks are registered
+def instrument(app):
+    if not enabled:
+        return
+    server = app.server
+
+    # (clientside callbacks run in the browser and have no server function to time)
+    for output, entry in app.callback_map.items():
+        if 'callback' in entry:
+            entry['callback'] = timed_callback(output, entry['callback'])
+
+    @server.before_request
+    def start_request_timer():
+        g.requestStart = time.perf_counter()
+        if profile_requested():
+            g.profiler = start_profile()
+
+    # registered after Compress(server), so this runs before the response is compressed; the time and size are
+    # recorded once the response has been sent, so they include compressing it
+    @server.after_request
+    def record_request(response):
+        label = route_label(app.callback_map)
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile-File'] = save_profile(profiler)
+        start = g.pop('requestStart', None)
+
+        def record():
+            if start is not None:
+                observe('soil_request_seconds', label, time.perf_counter() - start)
+            if not response.is_streamed:
+                observe('soil_response_bytes', label, response.calculate_content_length() or 0)
+        response.call_on_close(record)
+        return response
+
+    @server.route('/metrics')
+    def serve_metrics():
+        return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
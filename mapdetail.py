@@ -0,0 +1,73 @@
+# ----------------------------------------------------------------------------------------
+# level of detail for the SOCD map: each country's 5 arc-minute soil points binned into coarser and coarser grids,
+# so a zoomed out view of a big country sends a few thousand binned means instead of tens of thousands of points
+#
+# level 0 is the original points; each level after that doubles the grid cell size and holds the mean position and
+# mean SOCD of the points falling in each cell, so the finest level with few enough points in view can be sent
+
+import numpy as np
+
+# the soil dataset's grid spacing, 5 arc-minutes in degrees
+baseCellDegrees = 5 / 60
+# stop adding coarser levels once cells reach this size (2**8 * 5 arc-minutes is over 21 degrees)
+maxLevel = 8
+
+
+def bin_points(lon, lat, socd, cellDegrees):
+    # number each grid cell, then average the points sharing a cell number
+    column = np.floor(lon / cellDegrees).astype(np.int64)
+    row = np.floor(lat / cellDegrees).astype(np.int64)
+    cells, cellOfPoint = np.unique(column * 100000 + row, return_inverse=True)
+    counts = np.bincount(cellOfPoint, minlength=len(cells))
+    return tuple(np.bincount(cellOfPoint, weights=values, minlength=len(cells)) / counts for values in (lon, lat, socd))
+
+
+def detail_levels(lon, lat, socd):
+    levels = [(lon, lat, socd)]
+    for level in range(1, maxLevel + 1):
+        levels.append(bin_points(lon, lat, socd, baseCellDegrees * 2 ** level))
+        if len(levels[-1][0]) == 1:
+            break
+    return levels
+
+
+# the [west, south, east, north] bounds of a plotly map view from the graph's relayoutData, or None if it has no view
+def view_bounds(relayoutData):
+    if not relayoutData:
+        return None
+    derived = relayoutData.get('mapbox._derived')
+    if derived and derived.get('coordinates'):
+        corners = np.asarray(derived['coordinates'], dtype=float)
+        return [corners[:, 0].min(), corners[:, 1].min(), corners[:, 0].max(), corners[:, 1].max()]
+    center = relayoutData.get('mapbox.center')
+    zoom = relayoutData.get('mapbox.zoom')
+    if center is None or zoom is None:
+        return None
+    # without the derived corners, estimate the view from its center and zoom for a map about 1000 by 500 pixels
+    # (each zoom level halves the 360 degrees shown across 512 pixels)
+    lonSpan = 360 * 1000 / 512 / 2 ** zoom
+    latSpan = lonSpan / 2
+    return [center['lon'] - lonSpan / 2, center['lat'] - latSpan / 2, center['lon'] + lonSpan / 2, center['lat'] + latSpan / 2]
+
+
+def in_bounds(lon, lat, bounds):
+    west, south, east, north = bounds
+    return (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+
+
+# the finest level's points within the view (padded by half a view on each side, so small pans need no update)
+# of which there are at most maxPoints; with no view, the finest level showing the whole country within maxPoints
+def points_for_view(levels, bounds, maxPoints):
+    if bounds is not None:
+        west, south, east, north = bounds
+        padLon, padLat = (east - west) / 2, (north - south) / 2
+        bounds = [west - padLon, south - padLat, east + padLon, north + padLat]
+    for lon, lat, socd in levels:
+        if bounds is not None:
+            keep = in_bounds(lon, lat, bounds)
+            lon, lat, socd = lon[keep], lat[keep], socd[keep]
+        if len(lon) <= maxPoints:
+            return lon, lat, socd
+    # hard cap: even the coarsest level has too many points in view, so send an even sample of them
+    step = int(np.ceil(len(lon) / maxPoints))
+    return lon[::step], lat[::step], socd[::step]
@@ -0,0 +1,122 @@
+# ----------------------------------------------------------------------------------------
+# a grid bucket index over one country's soil points, for SOCD stats of the points in a box, lasso or radius on the map
+#
+# the points are sorted into square buckets, row by row, so the buckets across one row of a selection hold one contiguous
+# run of points; each bucket's count, sum, min and max are kept too, so buckets entirely inside a box are summed without
+# looking at their points, and only the points in buckets on the selection's edges are tested one by one
+
+import numpy as np
+
+# half a degree, six 5 arc-minute grid cells across
+bucketDegrees = 0.5
+# for radius selections: the earth's mean radius, and kilometres per degree of latitude
+earthRadiusKilometres = 6371.0088
+kilometresPerDegree = 111.32
+
+
+# whether each point is inside the polygon's ring by the even-odd rule, testing all the points against one edge at a time
+def points_in_polygon(lon, lat, ring):
+    ring = np.asarray(ring, dtype=float)
+    inside = np.zeros(len(lon), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+        crosses = (y1 <= lat) != (y2 <= lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inside ^= crosses & (lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+
+def stats(count, total, low, high):
+    if count == 0:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None}
+    return {'count': int(count), 'mean': float(total / count), 'min': float(low), 'max': float(high)}
+
+
+class GridIndex:
+    def __init__(self, lon, lat, socd):
+        self.west = np.floor(lon.min() / bucketDegrees) * bucketDegrees if len(lon) else 0.0
+        self.south = np.floor(lat.min() / bucketDegrees) * bucketDegrees if len(lat) else 0.0
+        columns = self.column(lon)
+        rows = self.row(lat)
+        self.columns = int(columns.max()) + 1 if len(lon) else 0
+        self.rows = int(rows.max()) + 1 if len(lat) else 0
+        buckets = rows * self.columns + columns
+        order = np.argsort(buckets, kind='stable')
+        self.lon, self.lat, self.socd = lon[order], lat[order], socd[order]
+        # where each bucket's points start, with one more for where the last ends
+        self.starts = np.searchsorted(buckets[order], np.arange(self.rows * self.columns + 1))
+        counts = np.diff(self.starts)
+        # running totals of the buckets' counts and SOCD sums, so a run of buckets is summed in one subtraction
+        self.countsBefore = np.concatenate([[0], np.cumsum(counts)])
+        self.sumsBefore = np.concatenate([[0.0], np.cumsum(np.bincount(buckets, weights=socd, minlength=len(counts)))])
+        self.mins = np.full(len(counts), np.inf)
+        self.maxs = np.full(len(counts), -np.inf)
+        filled = counts > 0
+        if filled.any():
+            self.mins[filled] = np.minimum.reduceat(self.socd, self.starts[:-1][filled])
+            self.maxs[filled] = np.maximum.reduceat(self.socd, self.starts[:-1][filled])
+
+    def column(self, lon):
+        return np.floor((np.asarray(lon) - self.west) / bucketDegrees).astype(np.int64)
+
+    def row(self, lat):
+        return np.floor((np.asarray(lat) - self.south) / bucketDegrees).astype(np.int64)
+
+    # the bucket rows and columns a box touches, clipped to the index; empty ranges when it misses every bucket
+    def bucket_ranges(self, west, south, east, north):
+        firstColumn, lastColumn = max(int(self.column(west)), 0), min(int(self.column(east)), self.columns - 1)
+        firstRow, lastRow = max(int(self.row(south)), 0), min(int(self.row(north)), self.rows - 1)
+        return firstRow, lastRow, firstColumn, lastColumn
+
+    # the points in the buckets a box touches, for testing one by one against a lasso or radius inside that box
+    def candidates(self, west, south, east, north):
+        firstRow, lastRow, firstColumn, lastColumn = self.bucket_ranges(west, south, east, north)
+        if firstRow > lastRow or firstColumn > lastColumn:
+            return self.lon[:0], self.lat[:0], self.socd[:0]
+        runs = [slice(self.starts[row * self.columns + firstColumn], self.starts[row * self.columns + lastColumn + 1])
+                for row in range(firstRow, lastRow + 1)]
+        return tuple(np.concatenate([values[run] for run in runs]) for values in (self.lon, self.lat, self.socd))
+
+    def box_stats(self, west, south, east, north):
+        firstRow, lastRow, firstColumn, lastColumn = self.bucket_ranges(west, south, east, north)
+        if firstRow > lastRow or firstColumn > lastColumn:
+            return stats(0, 0.0, None, None)
+        count, total, low, high = 0, 0.0, np.inf, -np.inf
+        # the buckets entirely inside the box
+        innerColumns = (int(np.ceil((west - self.west) / bucketDegrees)), int(np.floor((east - self.west) / bucketDegrees)) - 1)
+        innerRows = (int(np.ceil((south - self.south) / bucketDegrees)), int(np.floor((north - self.south) / bucketDegrees)) - 1)
+        edgePoints = []
+        for row in range(firstRow, lastRow + 1):
+            rowStart = row * self.columns
+            if innerRows[0] <= row <= innerRows[1] and max(innerColumns[0], firstColumn) <= min(innerColumns[1], lastColumn):
+                inner = (rowStart + max(innerColumns[0], firstColumn), rowStart + min(innerColumns[1], lastColumn) + 1)
+                count += self.countsBefore[inner[1]] - self.countsBefore[inner[0]]
+                total += self.sumsBefore[inner[1]] - self.sumsBefore[inner[0]]
+                low = min(low, self.mins[inner[0]:inner[1]].min())
+                high = max(high, self.maxs[inner[0]:inner[1]].max())
+                edgePoints.append(slice(self.starts[rowStart + firstColumn], self.starts[inner[0]]))
+                edgePoints.append(slice(self.starts[inner[1]], self.starts[rowStart + lastColumn + 1]))
+            else:
+                edgePoints.append(slice(self.starts[rowStart + firstColumn], self.starts[rowStart + lastColumn + 1]))
+        if edgePoints:
+            lon, lat, socd = (np.concatenate([values[run] for run in edgePoints]) for values in (self.lon, self.lat, self.socd))
+            socd = socd[(lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)]
+            if len(socd):
+                count, total = count + len(socd), total + socd.sum()
+                low, high = min(low, socd.min()), max(high, socd.max())
+        return stats(count, total, low, high)
+
+    def lasso_stats(self, ring):
+        ring = np.asarray(ring, dtype=float)
+        lon, lat, socd = self.candidates(ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max())
+        socd = socd[points_in_polygon(lon, lat, ring)]
+        return stats(len(socd), socd.sum(), socd.min(initial=np.inf), socd.max(initial=-np.inf))
+
+    def radius_stats(self, centerLon, centerLat, kilometres):
+        latSpan = kilometres / kilometresPerDegree
+        lonSpan = latSpan / max(np.cos(np.radians(centerLat)), 0.01)
+        lon, lat, socd = self.candidates(centerLon - lonSpan, centerLat - latSpan, centerLon + lonSpan, centerLat + latSpan)
+        # great circle distances, by the haversine formula
+        lon1, lat1, lon2, lat2 = (np.radians(values) for values in (centerLon, centerLat, lon, lat))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        socd = socd[2 * earthRadiusKilometres * np.arcsin(np.sqrt(a)) <= kilometres]
+        return stats(len(socd), socd.sum(), socd.min(initial=np.inf), socd.max(initial=-np.inf))
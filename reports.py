@@ -0,0 +1,118 @@
+# ----------------------------------------------------------------------------------------
+# per country reports for scripts: each country's mean SOCD and food trade totals as JSON or CSV, without the Dash callbacks
+#
+#     GET  /api/country-reports?country=France&country=China&format=csv
+#     POST /api/country-reports with a JSON body like {"countries": ["France", "China"], "format": "json"}
+# with no countries given every country is sent, and with year that year's trade (only dffood's 2019 without the trade store);
+# responses are tagged with a hash of what they hold, and a request already holding that tag gets an empty 304 Not Modified reply
+#
+# the table is built once per year, the first time it is asked for, with each country's row kept ready as a JSON object and a
+# CSV line, so a request only looks rows up and joins them; CSV is streamed a block of rows at a time as it is sent
+
+import csv
+import hashlib
+import io
+import json
+import threading
+
+from flask import Response, jsonify, request
+
+# the table's columns: SOCD for the soil data's (reporter) countries, trade totals for the trade data's (partner) countries
+columns = ['country', 'Reporter_Country_continent', 'Reporter_Country_pop_est', 'SOCDcountryMean', 'Export_Quantity_Sum', 'Export_Items_Count']
+csvBlockRows = 500
+
+
+class ReportTable:
+    def __init__(self, dfsoilMeans, dffoodPartners):
+        soil = dfsoilMeans.rename(columns={'Reporter_Country_name': 'country'})[columns[:4]]
+        trade = dffoodPartners.rename(columns={'Partner_Country_name': 'country'})[['country'] + columns[4:]]
+        # text columns may be categorical when loaded from typed column files
+        soil, trade = (frame.astype({'country': str}) for frame in (soil, trade))
+        table = soil.merge(trade, on='country', how='outer').sort_values('country', kind='mergesort')
+        # counts stay whole numbers, though the merge makes them floats to hold NaN for soil-only countries
+        table = table.astype({'Export_Items_Count': 'Int64'})
+        # None rather than NaN, for a country in only one of the datasets
+        table = table.astype(object).where(table.notna(), None)
+        self.rows = {}
+        self.lines = {}
+        for record in table.to_dict('records'):
+            self.rows[record['country']] = record
+            self.lines[record['country']] = csv_line([record[column] for column in columns])
+        self.header = csv_line(columns)
+        self.version = hashlib.sha1((self.header + ''.join(self.lines.values())).encode('utf-8')).hexdigest()
+
+
+def csv_line(values):
+    text = io.StringIO()
+    csv.writer(text, lineterminator='\n').writerow(['' if value is None else value for value in values])
+    return text.getvalue()
+
+
+# (as bytes, since a streamed response is handed to the server without being encoded)
+def stream_csv(table, countries):
+    yield table.header.encode('utf-8')
+    for start in range(0, len(countries), csvBlockRows):
+        yield ''.join(table.lines[country] for country in countries[start:start + csvBlockRows]).encode('utf-8')
+
+
+# the countries, format and year asked for, from the query string or a JSON body; a year that isn't a whole number is
+# returned as it was given, to be refused rather than taken as no year
+def report_request():
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        return body.get('countries'), body.get('format', 'json'), body.get('year')
+    countries = request.args.getlist('country') or None
+    year = request.args.get('year')
+    if year is not None and year.strip().lstrip('-').isdigit():
+        year = int(year)
+    return countries, request.args.get('format', 'json'), year
+
+
+# add the /api/country-reports route to the Flask server, with the functions that load the soil means and a year's trade
+# totals (None for dffood's), the years there are to choose from, and dffood's year, the only one when there are none
+def register(server, load_soil_means, load_food_partners, tradeYears, defaultYear=2019):
+    tables = {}
+    lock = threading.Lock()
+
+    def report_table(year):
+        if year not in tables:
+            with lock:
+                if year not in tables:
+                    tables[year] = ReportTable(load_soil_means(), load_food_partners(year))
+        return tables[year]
+
+    @server.route('/api/country-reports', methods=['GET', 'POST'])
+    def country_reports():
+        countries, format, year = report_request()
+        if format not in ('json', 'csv'):
+            return jsonify(error='format must be json or csv'), 400
+        if countries is not None and (not isinstance(countries, list) or not all(isinstance(country, str) for country in countries)):
+            return jsonify(error='countries must be a list of country names'), 400
+        # (bool is an int too, but true isn't a year)
+        if year is not None and (not isinstance(year, int) or isinstance(year, bool)):
+            return jsonify(error='year must be a whole number'), 400
+        years = tradeYears or [defaultYear]
+        if year is not None and year not in years:
+            return jsonify(error='no trade data for year %s' % year, years=years), 404
+        # the latest year by default
+        if year is None:
+            year = years[-1]
+        table = report_table(year if tradeYears else None)
+
+        missing = [country for country in countries if country not in table.rows] if countries is not None else []
+        found = [country for country in countries if country in table.rows] if countries is not None else list(table.rows)
+        etag = hashlib.sha1(json.dumps([table.version, format, found, missing]).encode('utf-8')).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            response = server.response_class(status=304)
+        elif format == 'csv':
+            response = Response(stream_csv(table, found), mimetype='text/csv')
+            # sent as it is made rather than gathered first to compress
+            response.direct_passthrough = True
+        else:
+            response = jsonify(year=year, columns=columns, reports=[table.rows[country] for country in found], missing=missing)
+        # (a weak tag, since the compressed bytes differ by encoding while the reports are the same)
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        return response
+
+    return report_table
@@ -0,0 +1,195 @@
+# ----------------------------------------------------------------------------------------
+# make the soil points dataset (dfsoil_subUSCN_prod.csv) from the global SOCD grid and country borders
+#
+# the SOCD5min grid (http://globalchange.bnu.edu.cn/research/soilw) has one value per 5 arc-minute cell, 2160 rows from
+# 90N down to 90S by 4320 columns from 180W; each cell center is kept as a point, with its country's name, continent,
+# ISO3 code and population, when it has a value and falls in one of the chosen countries
+#
+# countries are drawn once onto a grid of the same shape (a country mask, cached in the data folder), by finding where
+# each row of cell centers crosses the borders, rather than testing every point against every border; the grid is then
+# read in tiles of rows, memory-mapped, by a pool of processes (one per core by default) that each look up their tile's
+# cells in the mask
+#
+# run from the repository root with:
+#     python soilpoints.py <SOCD grid .npy or .nc> <countries .geojson> [--countries NAME ...] [--processes N]
+# the grid can be a .npy array (rows by columns, or layers by rows by columns), or a NetCDF file when netCDF4 is installed;
+# the countries file is GeoJSON with name, continent, iso_a3 and pop_est properties, like GeoPandas' naturalearth_lowres;
+# then convert the new CSV with `python datastore.py` as usual
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import datastore
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+# the grid's shape and position: its top left corner and the size of each cell, in degrees
+gridWest = -180.0
+gridNorth = 90.0
+cellDegrees = 5 / 60
+tileRows = 120
+
+outputCsv = 'dfsoil_subUSCN_prod.csv'
+socdColumn = 'Reporter_Country_SOCD_depth4_5'
+# the country properties kept, as named in the GeoJSON (or in Natural Earth's own upper case), and the columns they go in
+countryProperties = {
+    'name': 'Reporter_Country_name',
+    'continent': 'Reporter_Country_continent',
+    'iso_a3': 'Reporter_Country_iso_a3',
+    'pop_est': 'Reporter_Country_pop_est',
+}
+
+
+# the grid as an array that is read only where it is sliced: memory-mapped for .npy, or read from disk for NetCDF
+def open_grid(path, variable=None):
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    if netCDF4 is None:
+        raise ImportError('reading NetCDF grids needs the netCDF4 package; or save the grid as .npy first')
+    dataset = netCDF4.Dataset(path)
+    if variable is None:
+        # the largest variable in the file is the grid itself, rather than its coordinates
+        variable = max(dataset.variables, key=lambda name: dataset.variables[name].size)
+    return dataset.variables[variable]
+
+
+def read_window(grid, rowStart, rowStop, layer=0):
+    window = grid[layer, rowStart:rowStop] if len(grid.shape) == 3 else grid[rowStart:rowStop]
+    # NetCDF fill values come back masked
+    return np.ma.filled(np.ma.asarray(window, dtype=np.float64), np.nan)
+
+
+def read_countries(path):
+    with open(path) as f:
+        features = json.load(f)['features']
+    countries = []
+    for feature in features:
+        properties = feature['properties']
+        country = {key: properties.get(key, properties.get(key.upper())) for key in countryProperties}
+        geometry = feature['geometry']
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        # the outer border and any holes of every part; rows are crossed an odd number of times only inside the country
+        country['rings'] = [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+        countries.append(country)
+    return countries
+
+
+# which cells of a block of the grid have their centers inside the rings (by the even-odd rule), as a boolean array
+# every edge is matched with the rows of cell centers it crosses and where along the row it crosses them; counting crossings
+# from the left of each row then gives inside where the count is odd
+def rasterize(rings, rowStart, rowStop, colStart, colStop):
+    rows, cols = rowStop - rowStart, colStop - colStart
+    top = gridNorth - rowStart * cellDegrees
+    left = gridWest + colStart * cellDegrees
+    crossings = np.zeros((rows, cols + 1), dtype=np.int32)
+    for ring in rings:
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        # the rows whose center latitude is in [lower end, upper end) of each edge, so a vertex is never counted twice
+        firstRow = np.clip(np.floor((top - np.maximum(y1, y2)) / cellDegrees - 0.5) + 1, 0, rows).astype(np.int64)
+        lastRow = np.clip(np.floor((top - np.minimum(y1, y2)) / cellDegrees - 0.5), -1, rows - 1).astype(np.int64)
+        counts = np.maximum(lastRow - firstRow + 1, 0)
+        edge = np.repeat(np.arange(len(x1)), counts)
+        row = firstRow[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+        latitude = top - (row + 0.5) * cellDegrees
+        x = x1[edge] + (latitude - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+        # the first cell whose center is right of the crossing
+        col = np.clip(np.ceil((x - left) / cellDegrees - 0.5), 0, cols).astype(np.int64)
+        np.add.at(crossings, (row, col), 1)
+    return np.cumsum(crossings, axis=1)[:, :cols] % 2 == 1
+
+
+# the index in countries of the country each cell center is in, or -1 for none
+def country_mask(countries, shape):
+    mask = np.full(shape, -1, dtype=np.int16)
+    for number, country in enumerate(countries):
+        points = np.concatenate(country['rings'])
+        colStart = max(int(np.floor((points[:, 0].min() - gridWest) / cellDegrees)), 0)
+        colStop = min(int(np.ceil((points[:, 0].max() - gridWest) / cellDegrees)) + 1, shape[1])
+        rowStart = max(int(np.floor((gridNorth - points[:, 1].max()) / cellDegrees)), 0)
+        rowStop = min(int(np.ceil((gridNorth - points[:, 1].min()) / cellDegrees)) + 1, shape[0])
+        if rowStart >= rowStop or colStart >= colStop:
+            continue
+        inside = rasterize(country['rings'], rowStart, rowStop, colStart, colStop)
+        block = mask[rowStart:rowStop, colStart:colStop]
+        # where borders overlap, the country listed first keeps the cell
+        block[inside & (block == -1)] = number
+    return mask
+
+
+# the mask for a countries file and grid shape, drawn once and then read from the data folder
+def cached_country_mask(countriesPath, countries, shape):
+    maskPath = os.path.join(datastore.dataDir, 'countrymask-%s-%dx%d.npy' % (datastore.file_version(countriesPath), shape[0], shape[1]))
+    if not os.path.exists(maskPath):
+        os.makedirs(datastore.dataDir, exist_ok=True)
+        # written under a temporary name first, so a half-written mask is never picked up
+        np.save(maskPath + '.tmp.npy', country_mask(countries, shape), allow_pickle=False)
+        os.replace(maskPath + '.tmp.npy', maskPath)
+    return maskPath
+
+
+# one tile's points: the grid position, country and SOCD of each cell with a value in one of the wanted countries
+# (run in the pool's processes, which each open the memory-mapped grid and mask for themselves)
+def tile_points(gridPath, variable, layer, nodata, maskPath, wanted, rowStart, rowStop):
+    values = read_window(open_grid(gridPath, variable), rowStart, rowStop, layer)
+    codes = np.load(maskPath, mmap_mode='r')[rowStart:rowStop]
+    keep = np.isin(codes, wanted) & ~np.isnan(values)
+    if nodata is not None:
+        keep &= values != nodata
+    rows, cols = np.nonzero(keep)
+    return (rows + rowStart).astype(np.int32), cols.astype(np.int32), codes[rows, cols], values[rows, cols]
+
+
+# the soil points dataframe, with the Reporter_Country_* columns the app reads, grouped by country
+def grid_points(gridPath, countriesPath, countryNames=None, variable=None, layer=0, nodata=None, processes=None):
+    countries = read_countries(countriesPath)
+    shape = open_grid(gridPath, variable).shape[-2:]
+    maskPath = cached_country_mask(countriesPath, countries, shape)
+    wanted = np.array([number for number, country in enumerate(countries) if countryNames is None or country['name'] in countryNames],
+                      dtype=np.int16)
+    tiles = [(gridPath, variable, layer, nodata, maskPath, wanted, rowStart, min(rowStart + tileRows, shape[0]))
+             for rowStart in range(0, shape[0], tileRows)]
+    if processes == 1:
+        results = [tile_points(*tile) for tile in tiles]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(tile_points, *zip(*tiles)))
+    rows, cols, codes, values = (np.concatenate(parts) for parts in zip(*results))
+
+    # group by country, keeping the grid's row by row order within each
+    order = np.argsort(codes, kind='stable')
+    rows, cols, codes, values = rows[order], cols[order], codes[order], values[order]
+    # each country's properties looked up by its index, for all points at once
+    dfsoil = pd.DataFrame({column: np.array([country[key] for country in countries], dtype=object)[codes]
+                           for key, column in countryProperties.items()})
+    dfsoil['Reporter_Country_pop_est'] = dfsoil['Reporter_Country_pop_est'].astype(np.float64)
+    dfsoil['Reporter_Country_lon'] = gridWest + (cols + 0.5) * cellDegrees
+    dfsoil['Reporter_Country_lat'] = gridNorth - (rows + 0.5) * cellDegrees
+    dfsoil[socdColumn] = values
+    return dfsoil
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='make the soil points dataset from the SOCD grid and country borders')
+    parser.add_argument('grid', help='SOCD grid, .npy or .nc')
+    parser.add_argument('countries', help='country borders, .geojson')
+    parser.add_argument('--countries', dest='countryNames', nargs='+', help='names of the countries to keep (all by default)')
+    parser.add_argument('--variable', help='the NetCDF variable holding the grid (the largest by default)')
+    parser.add_argument('--layer', type=int, default=0, help='which depth layer, for grids with several (the surface layer by default)')
+    parser.add_argument('--nodata', type=float, help='the value marking cells without data, besides NaN')
+    parser.add_argument('--processes', type=int, help='processes reading tiles (one per core by default)')
+    options = parser.parse_args()
+
+    dfsoil = grid_points(options.grid, options.countries, options.countryNames, options.variable, options.layer,
+                         options.nodata, options.processes)
+    csvPath = os.path.join(datastore.dataDir, outputCsv)
+    dfsoil.to_csv(csvPath, index=False)
+    print('wrote %d points in %d countries to %s' % (len(dfsoil), dfsoil['Reporter_Country_name'].nunique(), csvPath))
@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------------------------
+# build the food trade data for every year from the FAOSTAT Detailed Trade Matrix, one typed column store per year
+#
+# the bulk download (Trade_DetailedTradeMatrix_E_All_Data_(Normalized).zip, or the CSV inside it) has one row per
+# reporter, partner, item, element and year, and is several GB; it is read a chunk of rows at a time, keeping only
+# export quantities in tonnes (not the head counts of live animals) reported by the countries in the soil data, summed per
+# reporter, partner and item for each year into ./data/trade/year=<year>.columns/ (with the same columns as dffood, but a
+# year-neutral quantity column name)
+#
+# reporters are matched by name, and the soil data's names (from geopandas, e.g. 'Russia', 'Vietnam') aren't always
+# FAOSTAT's ('Russian Federation', 'Viet Nam'), so the soil data's countries with no export rows in the file are listed
+#
+# ingest a download (again whenever a newer one is published) by running:
+#     python tradestore.py <path to the zip or CSV>
+# years that already have a store are skipped, so a rerun only adds the new years; delete a year's folder to rebuild it
+
+import os
+import sys
+import zipfile
+
+import pandas as pd
+
+import datastore
+
+tradeDir = os.path.join(datastore.dataDir, 'trade')
+
+# the FAOSTAT columns read, and the names they are stored under
+sourceColumns = {
+    'Reporter Countries': 'Reporter_Country_name_x',
+    'Partner Countries': 'Partner_Country_name',
+    'Item': 'Item',
+    'Element': 'Element',
+    'Unit': 'Unit',
+    'Year': 'Year',
+    'Value': 'Value',
+}
+exportElement = 'Export Quantity'
+# older downloads write tonnes out, newer ones as 't'
+exportUnits = ['tonnes', 't']
+quantityColumn = 'Export_Quantity_Value_tonnes'
+keyColumns = ['Reporter_Country_name_x', 'Partner_Country_name', 'Item']
+chunkRows = 500000
+
+
+def year_path(year):
+    return os.path.join(tradeDir, 'year=%d.columns' % year)
+
+
+# the years with a complete store, oldest first
+def years():
+    if not os.path.isdir(tradeDir):
+        return []
+    found = []
+    for name in os.listdir(tradeDir):
+        if name.startswith('year=') and name.endswith('.columns') and os.path.exists(os.path.join(tradeDir, name, 'meta.json')):
+            found.append(int(name[len('year='):-len('.columns')]))
+    return sorted(found)
+
+
+def load_year(year, mmapMode='r'):
+    return datastore.read_column_store(year_path(year), mmapMode=mmapMode)
+
+
+# the bulk zip holds the normalized CSV alongside small code lists, so read the largest CSV in it
+def open_source(path):
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        member = max((info for info in archive.infolist() if info.filename.lower().endswith('.csv')), key=lambda info: info.file_size)
+        return archive.open(member)
+    return open(path, 'rb')
+
+
+# the reporter countries shown on the map, whose exports the app charts
+def soil_reporters():
+    dfsoil = datastore.load_frame('dfsoil_subUSCN_prod.csv')
+    return sorted(str(country) for country in pd.unique(dfsoil['Reporter_Country_name']))
+
+
+def sum_by_key(frames):
+    combined = pd.concat(frames, ignore_index=True)
+    return combined.groupby(['Year'] + keyColumns, observed=True, sort=False)[quantityColumn].sum().reset_index()
+
+
+# stream the source's rows, keeping the export quantities in tonnes of the given reporters outside the years to skip,
+# as per year, reporter, partner and item sums, and the reporters with any export rows; only the running sums are held
+# in memory, never the whole file
+def read_exports(sourcePath, reporters, skipYears=()):
+    sums = []
+    matched = set()
+    with open_source(sourcePath) as source:
+        # FAOSTAT bulk files are Latin-1 encoded
+        chunks = pd.read_csv(source, usecols=list(sourceColumns), encoding='latin-1', chunksize=chunkRows,
+                             dtype={'Reporter Countries': 'category', 'Partner Countries': 'category', 'Item': 'category',
+                                    'Element': 'category', 'Unit': 'category', 'Year': 'int32', 'Value': 'float64'})
+        for chunk in chunks:
+            chunk = chunk.rename(columns=sourceColumns)
+            keep = (chunk['Element'] == exportElement) & chunk['Reporter_Country_name_x'].isin(reporters)
+            matched.update(str(reporter) for reporter in pd.unique(chunk.loc[keep, 'Reporter_Country_name_x']))
+            keep &= chunk['Unit'].isin(exportUnits)
+            if skipYears:
+                keep &= ~chunk['Year'].isin(skipYears)
+            chunk = chunk[keep & chunk['Value'].notna()]
+            if len(chunk) == 0:
+                continue
+            # each chunk has its own categories, so sum them as text
+            chunk = chunk.astype({column: str for column in keyColumns}).rename(columns={'Value': quantityColumn})
+            sums.append(sum_by_key([chunk]))
+            # fold the partial sums together now and then, so they stay about the size of the result
+            if len(sums) >= 16:
+                sums = [sum_by_key(sums)]
+    if not sums:
+        return pd.DataFrame(columns=['Year'] + keyColumns + [quantityColumn]), matched
+    return sum_by_key(sums), matched
+
+
+# add a store for each year in the source that doesn't have one yet, and return the years added
+# and the soil data's countries that matched no reporter in the source
+def ingest(sourcePath):
+    existing = years()
+    reporters = soil_reporters()
+    exports, matched = read_exports(sourcePath, reporters, skipYears=existing)
+    version = '%s:%d' % (os.path.basename(sourcePath), os.path.getsize(sourcePath))
+    added = []
+    for year, rows in exports.groupby('Year', sort=True):
+        rows = rows.drop(columns='Year').sort_values(keyColumns, kind='mergesort').reset_index(drop=True)
+        datastore.write_column_store(rows, year_path(int(year)), version)
+        added.append(int(year))
+    return added, [country for country in reporters if country not in matched]
+
+
+if __name__ == '__main__':
+    added, unmatched = ingest(sys.argv[1])
+    print('added %d years to %s: %s' % (len(added), tradeDir, ', '.join(map(str, added)) or 'none new'))
+    if unmatched:
+        print('no exports reported under these soil data country names, so they have no trade data: %s' % ', '.join(unmatched))
@@ -0,0 +1,110 @@
+# ----------------------------------------------------------------------------------------
+# prebuild the app's cached figures in a background thread when a worker starts, so its first visitors don't wait for them
+#
+# the app lists what to build (see configure in app.py): a few fixed tasks, then the countries' map figures in the order they
+# are most often chosen; each worker starts building once it has loaded the app (from gunicorn.conf.py's post_worker_init hook)
+# and serves requests meanwhile, so warming up never holds back the worker being ready; progress is reported at /health
+#
+# how often each country is chosen is counted in each worker and added to ./data/country_popularity.json when it exits,
+# and the countries are put in that order when each worker starts warming up, not when the app is loaded (which, with
+# gunicorn --preload, is only once in the master), so the order carries over as workers are recycled
+# (set SOIL_WARMUP=0 to turn warming up off)
+
+import collections
+import fcntl
+import json
+import os
+import functools
+import threading
+import time
+
+import datastore
+
+enabled = os.environ.get('SOIL_WARMUP', '1') == '1'
+popularityPath = os.path.join(datastore.dataDir, 'country_popularity.json')
+
+# set by the app: (label, function) pairs to run first, then the countries whose figures are built with buildCountry,
+# at most countryLimit of them
+tasks = []
+countries = []
+settings = {'buildCountry': None, 'countryLimit': None}
+state = {'total': 0, 'done': 0, 'failed': 0, 'current': None, 'startedAt': None, 'finishedAt': None}
+lock = threading.Lock()
+requested = collections.Counter()
+
+
+def configure(warmupTasks, warmupCountries=(), buildCountry=None, countryLimit=None):
+    tasks[:] = warmupTasks
+    countries[:] = warmupCountries if buildCountry is not None else []
+    settings.update(buildCountry=buildCountry, countryLimit=countryLimit)
+    state['total'] = len(tasks) + len(countries[:countryLimit])
+
+
+def read_popularity():
+    try:
+        with open(popularityPath) as f:
+            return collections.Counter(json.load(f))
+    except (OSError, ValueError):
+        return collections.Counter()
+
+
+# most often chosen first, then the rest in the order given
+def by_popularity(countries):
+    counts = read_popularity()
+    return sorted(countries, key=lambda country: -counts.get(str(country), 0))
+
+
+def record(country):
+    if country is not None:
+        with lock:
+            requested[country] += 1
+
+
+# add this worker's counts to the file; workers exiting at the same time take turns through a lock on the file
+def save_popularity():
+    with lock:
+        counts = collections.Counter(requested)
+        requested.clear()
+    if not counts:
+        return
+    os.makedirs(os.path.dirname(popularityPath) or '.', exist_ok=True)
+    with open(popularityPath + '.lock', 'w') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        counts.update(read_popularity())
+        with open(popularityPath + '.tmp', 'w') as f:
+            json.dump(dict(counts.most_common()), f)
+        os.replace(popularityPath + '.tmp', popularityPath)
+
+
+# the fixed tasks, then the most often chosen countries by the counts saved so far
+def ordered_tasks():
+    chosen = by_popularity(countries)[:settings['countryLimit']]
+    return tasks + [('map: %s' % country, functools.partial(settings['buildCountry'], country)) for country in chosen]
+
+
+def run():
+    for label, build in ordered_tasks():
+        state['current'] = label
+        try:
+            build()
+        except Exception:
+            # a figure that fails here is simply built (or fails) again when it is first requested
+            state['failed'] += 1
+        state['done'] += 1
+    state['current'] = None
+    state['finishedAt'] = time.time()
+
+
+# start building in a daemon thread, which stops with the worker; only once per process
+def start():
+    if not enabled or state['startedAt'] is not None:
+        return
+    state['startedAt'] = time.time()
+    threading.Thread(target=run, name='warmup', daemon=True).start()
+
+
+def progress():
+    report = dict(state, enabled=enabled, finished=state['finishedAt'] is not None)
+    if state['startedAt'] is not None:
+        report['seconds'] = round((state['finishedAt'] or time.time()) - state['startedAt'], 3)
+    return report